@@ -0,0 +1,96 @@
+"""
+Schedules jobs, restarts the scheduler and lets it catch up on all of them, like after the Bot was offline.
+
+Run from the project root: python -m benchmarks.scheduled_jobs [job amounts...]
+"""
+
+import asyncio
+import datetime
+import os
+import random
+import sys
+import time
+
+from internal_tools.scheduler import Scheduler
+
+NAME = "_benchmark_scheduler"
+
+
+def remove_files():
+    for filename in os.listdir("data"):
+        if filename.startswith(NAME):
+            os.remove(f"data/{filename}")
+
+
+def timed(func):
+    start = time.perf_counter()
+    result = func()
+    return time.perf_counter() - start, result
+
+
+async def catch_up(scheduler: Scheduler) -> float:
+    async def handler(job):
+        pass
+
+    scheduler.add_handler("benchmark", handler)
+
+    start = time.perf_counter()
+    scheduler.start()
+    while scheduler.pending:
+        await asyncio.sleep(0.01)
+    elapsed = time.perf_counter() - start
+
+    scheduler.stop()
+    return elapsed
+
+
+def bench(job_amount: int):
+    remove_files()
+
+    scheduler = Scheduler(NAME)
+    now = datetime.datetime.now()
+
+    def schedule():
+        for i in range(job_amount):
+            scheduler.schedule(
+                now - datetime.timedelta(seconds=random.randrange(86400)),
+                "benchmark",
+                {"user_id": i, "text": "Reminder"},
+            )
+
+    schedule_time, _ = timed(schedule)
+    flush_time, _ = timed(scheduler.store.flush)
+    scheduler.store.data.close()  # type: ignore
+
+    restarted = Scheduler(NAME)
+    load_time, _ = timed(lambda: asyncio.run(restarted.load()))
+    catch_up_time = asyncio.run(catch_up(restarted))
+    restarted.store.flush()
+
+    results = [
+        schedule_time / job_amount * 1_000_000,
+        flush_time,
+        load_time,
+        catch_up_time,
+        job_amount / catch_up_time,
+        restarted.max_delay,
+    ]
+
+    restarted.store.data.close()  # type: ignore
+    remove_files()
+
+    return results
+
+
+if __name__ == "__main__":
+    job_amounts = [int(x) for x in sys.argv[1:]] or [100_000, 1_000_000]
+
+    print("Schedule in µs per job, everything else in s (or jobs per s)")
+    print(
+        f"{'jobs':>9} {'schedule':>9} {'write':>7} {'load':>7} {'catch up':>9} {'jobs/s':>9} {'max delay':>10}"
+    )
+    for job_amount in job_amounts:
+        schedule, write, load, catch_up_time, rate, max_delay = bench(job_amount)
+        print(
+            f"{job_amount:>9} {schedule:>9.1f} {write:>7.2f} {load:>7.2f} {catch_up_time:>9.2f} {rate:>9.0f} {max_delay:>10.1f}"
+        )
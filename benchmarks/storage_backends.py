@@ -0,0 +1,121 @@
+"""
+Compares the snapshot (JSON) storage of JsonDictSaver with the SQLite storage.
+
+Run from the project root: python -m benchmarks.storage_backends [key amounts...]
+"""
+
+import os
+import random
+import sqlite3
+import sys
+import time
+
+from internal_tools.configuration import JsonDictSaver
+
+NAME = "_benchmark_storage"
+
+
+def remove_files():
+    for filename in os.listdir("data"):
+        if filename.startswith(NAME):
+            os.remove(f"data/{filename}")
+
+
+def timed(func):
+    start = time.perf_counter()
+    result = func()
+    return time.perf_counter() - start, result
+
+
+class _FailingConnection:
+    """
+    Stands in for the sqlite connection of a store and fails every write.
+    """
+
+    def __init__(self, connection: sqlite3.Connection) -> None:
+        self.connection = connection
+
+    def __enter__(self):
+        return self.connection.__enter__()
+
+    def __exit__(self, *args):
+        return self.connection.__exit__(*args)
+
+    def executemany(self, *args):
+        raise sqlite3.OperationalError("database is locked")
+
+
+def check_failed_write():
+    """
+    A write that fails has to be done again by the next save, also for keys that don't fit the cache anymore.
+    """
+    remove_files()
+
+    store = JsonDictSaver(NAME, storage="sqlite", sqlite_cache_size=10)
+    mapping = store.data
+    connection = mapping._connection
+
+    for i in range(100):
+        store[i] = {"guild_id": i, "enabled": True}
+
+    mapping._connection = _FailingConnection(connection)
+    try:
+        store.save()
+    except sqlite3.OperationalError:
+        pass
+    else:
+        raise AssertionError("The write was expected to fail")
+
+    mapping._connection = connection
+    store.save()
+    mapping.close()
+
+    reloaded = JsonDictSaver(NAME, storage="sqlite")
+    assert [reloaded[i]["guild_id"] for i in range(100)] == list(range(100))
+    reloaded.data.close()  # type: ignore
+
+    remove_files()
+
+
+def bench(storage: str, key_amount: int):
+    remove_files()
+
+    store = JsonDictSaver(NAME, storage=storage)  # type: ignore
+
+    def fill():
+        for i in range(key_amount):
+            store[i] = {"guild_id": i, "enabled": True, "prefix": "!"}
+        store.save()
+
+    fill_time, _ = timed(fill)
+    load_time, store = timed(lambda: JsonDictSaver(NAME, storage=storage))  # type: ignore
+
+    keys = random.sample(range(key_amount), min(1000, key_amount))
+    read_time, _ = timed(lambda: [store[k] for k in keys])
+
+    def update():
+        for k in keys[:100]:
+            store[k] = {"guild_id": k, "enabled": False, "prefix": "?"}
+        store.save()
+
+    update_time, _ = timed(update)
+
+    remove_files()
+
+    return fill_time, load_time, read_time, update_time
+
+
+if __name__ == "__main__":
+    key_amounts = [int(x) for x in sys.argv[1:]] or [10_000, 100_000, 1_000_000]
+
+    check_failed_write()
+
+    print(
+        f"{'keys':>10} {'storage':>9} {'fill+save':>10} {'load':>10} {'1k reads':>10} {'100 upd+save':>13}"
+    )
+    for key_amount in key_amounts:
+        for storage in ["snapshot", "sqlite"]:
+            fill_time, load_time, read_time, update_time = bench(storage, key_amount)
+            print(
+                f"{key_amount:>10} {storage:>9} {fill_time:>9.3f}s {load_time:>9.3f}s {read_time:>9.3f}s {update_time:>12.3f}s"
+            )
@@ -0,0 +1,95 @@
+"""
+Compares lookups through a JsonDictSaver index with going over every value.
+
+Run from the project root: python -m benchmarks.store_indexes [key amounts...]
+"""
+
+import datetime
+import os
+import random
+import sys
+import time
+
+from internal_tools.configuration import JsonDictSaver
+
+NAME = "_benchmark_indexes"
+LOOKUPS = 1000
+SCANS = 10  # Going over every value is slow, so fewer of those
+
+
+def remove_files():
+    for filename in os.listdir("data"):
+        if filename.startswith(NAME):
+            os.remove(f"data/{filename}")
+
+
+def timed(func):
+    start = time.perf_counter()
+    result = func()
+    return time.perf_counter() - start, result
+
+
+def bench(key_amount: int):
+    remove_files()
+
+    store = JsonDictSaver(NAME)
+    now = datetime.datetime(2025, 1, 1)
+    for i in range(key_amount):
+        store[i] = {
+            "guild_id": i % 1000,
+            "expires": now + datetime.timedelta(minutes=i),
+        }
+
+    index_time, _ = timed(lambda: store.add_index("guild", "guild_id"))
+    store.add_index("expires", "expires")
+
+    guild_ids = [random.randrange(1000) for _ in range(LOOKUPS)]
+
+    def scan_equal():
+        for guild_id in guild_ids[:SCANS]:
+            [k for k, v in store.items() if v["guild_id"] == guild_id]
+
+    def index_equal():
+        for guild_id in guild_ids:
+            store.index("guild").equal(guild_id)
+
+    def scan_range():
+        for i in range(SCANS):
+            before = now + datetime.timedelta(minutes=i * 10)
+            [k for k, v in store.items() if v["expires"] < before]
+
+    def index_range():
+        for i in range(LOOKUPS):
+            store.index("expires").range(end=now + datetime.timedelta(minutes=i % 100))
+
+    def update():
+        for i in range(LOOKUPS):
+            store[i]["guild_id"] = (i + 1) % 1000
+
+    # Per lookup / update, in ms
+    results = [
+        index_time * 1000,
+        timed(scan_equal)[0] / SCANS * 1000,
+        timed(index_equal)[0] / LOOKUPS * 1000,
+        timed(scan_range)[0] / SCANS * 1000,
+        timed(index_range)[0] / LOOKUPS * 1000,
+        timed(update)[0] / LOOKUPS * 1000,
+    ]
+
+    remove_files()
+
+    return results
+
+
+if __name__ == "__main__":
+    key_amounts = [int(x) for x in sys.argv[1:]] or [10_000, 100_000]
+
+    print("Build in ms, everything else in ms per lookup / update")
+    print(
+        f"{'keys':>8} {'build':>9} {'equal scan':>11} {'equal index':>12} {'range scan':>11} {'range index':>12} {'update':>8}"
+    )
+    for key_amount in key_amounts:
+        build, scan_equal, index_equal, scan_range, index_range, update = bench(key_amount)
+        print(
+            f"{key_amount:>8} {build:>9.1f} {scan_equal:>11.2f} {index_equal:>12.4f} {scan_range:>11.2f} {index_range:>12.4f} {update:>8.4f}"
+        )
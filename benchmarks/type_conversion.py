@@ -0,0 +1,107 @@
+"""
+Compares the load time (orjson.loads + type conversion) of the old, regex-per-string conversion with the current one.
+
+Run from the project root: python -m benchmarks.type_conversion [entry amounts...]
+"""
+
+import datetime
+import random
+import re
+import sys
+import time
+import uuid
+
+import orjson
+
+from internal_tools.configuration import _convert_data
+
+
+def legacy_convert_single_value(val):
+    if isinstance(val, str):
+        if val.isnumeric():
+            val = int(val)
+
+        elif val.replace(".", "").isnumeric() and val.count(".") == 1:
+            val = float(val)
+
+        elif val == "true":
+            val = True
+
+        elif val == "false":
+            val = False
+
+        elif val == "null":
+            val = None
+
+        elif re.match(r"\d{1,4}-\d{1,2}-\d{1,2}T\d{1,2}:\d{1,2}:\d{1,2}", val):
+            val = datetime.datetime.fromisoformat(val)
+
+        elif re.match(r"\d{1,4}-\d{1,2}-\d{1,2}", val):
+            val = datetime.date.fromisoformat(val)
+
+        elif re.match(r"\d{1,2}:\d{1,2}:\d{1,2}", val):
+            val = datetime.time.fromisoformat(val)
+
+        elif re.match(
+            r"[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}",
+            val,
+        ):
+            val = uuid.UUID(f"{{{val}}}")
+
+    return val
+
+
+def legacy_convert_data(data: dict):
+    new_data = {}
+
+    for key, sub_data in data.items():
+        if isinstance(sub_data, dict):
+            sub_data = legacy_convert_data(sub_data)
+        else:
+            sub_data = legacy_convert_single_value(sub_data)
+
+        new_data[legacy_convert_single_value(key)] = sub_data
+
+    return new_data
+
+
+def generate(entry_amount: int) -> bytes:
+    now = datetime.datetime(2024, 1, 1)
+    data = {}
+
+    for i in range(entry_amount):
+        data[random.randrange(10**17, 10**18)] = {
+            "name": f"user{i}",
+            "joined": now - datetime.timedelta(minutes=random.randrange(10**6)),
+            "birthday": datetime.date(2000, 1, 1)
+            + datetime.timedelta(days=random.randrange(10000)),
+            "reminder": datetime.time(random.randrange(24), 0, 0),
+            "id": uuid.uuid4(),
+            "enabled": random.choice([True, False]),
+            "level": random.randrange(100),
+            "language": random.choice(["en", "de", "fr"]),
+            "note": "Some free text that should stay a string",
+        }
+
+    return orjson.dumps(data, option=orjson.OPT_NON_STR_KEYS)
+
+
+def timed_load(content: bytes, convert) -> float:
+    start = time.perf_counter()
+    convert(orjson.loads(content))
+    return time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    entry_amounts = [int(x) for x in sys.argv[1:]] or [1_000, 10_000, 100_000]
+
+    print(f"{'entries':>10} {'size':>10} {'before':>10} {'after':>10} {'speedup':>8}")
+    for entry_amount in entry_amounts:
+        content = generate(entry_amount)
+
+        before = timed_load(content, legacy_convert_data)
+        after = timed_load(content, _convert_data)
+
+        print(
+            f"{entry_amount:>10} {len(content) // 1024:>8}KB {before:>9.3f}s {after:>9.3f}s {before / after:>7.1f}x"
+        )
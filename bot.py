@@ -1,20 +1,59 @@
 import logging
 import os
 import sys
+from typing import Optional
+
+from internal_tools.startup import STARTUP_PROFILER
+
+with STARTUP_PROFILER.phase("import interactions"):
+    import interactions
+    from interactions.api.http.route import Route
+
+with STARTUP_PROFILER.phase("load configuration"):
+    from internal_tools.configuration import CONFIG
+
+from internal_tools.auto_defer import AUTO_DEFER_TRACKER, client_auto_defer
+from internal_tools.bot_stats import BOT_STATS
+from internal_tools.cache_policy import cache_kwargs
+from internal_tools.command_metrics import COMMAND_METRICS
+from internal_tools.error_reporter import ERROR_REPORTER
+from internal_tools.extension_loader import (
+    EXTENSION_CATALOG,
+    EXTENSION_LOADER,
+    discover_extensions,
+)
+from internal_tools.general import error_webhook_send
+from internal_tools.hot_reload import HotReloader
+from internal_tools.http_client import HTTP_CLIENT
+from internal_tools.logging_setup import setup_logging
+from internal_tools.loop_monitor import LOOP_MONITOR
+from internal_tools.metrics_server import MetricsServer
+from internal_tools.scheduler import SCHEDULER
+from internal_tools.work_pool import WORK_POOL, track_command
 
-import interactions
 
-from internal_tools.configuration import CONFIG
-from internal_tools.general import error_webhook_send
+def _option(name: str) -> Optional[str]:
+    """
+    Value of a "--name=value" command line option, None if it isn't given.
+    """
+    for arg in sys.argv[1:]:
+        if arg.startswith(f"--{name}="):
+            return arg.split("=", 1)[1]
+
+    return None
+
 
 if __name__ == "__main__":
+    profile_startup = "--profile-startup" in sys.argv
+    args = [x for x in sys.argv[1:] if not x.startswith("--")]
+
+    # Given by supervisor.py to the workers it starts
+    shard_ids = _option("shard-ids")
+    total_shards = _option("total-shards")
+    metrics_port = _option("metrics-port")
+
+    setup_logging(_option("log-file"))
     logger = logging.getLogger("DiscordBot")
-    logger.setLevel(logging.WARNING)
-    handler = logging.FileHandler(filename="bot.log", encoding="utf-8", mode="w")
-    handler.setFormatter(
-        logging.Formatter("%(asctime)s:%(levelname)s:%(name)s: %(message)s")
-    )
-    logger.addHandler(handler)
 
     intents = interactions.Intents.DEFAULT
     if CONFIG["GENERAL"]["MEMBERS_INTENT"]:
@@ -24,11 +63,52 @@ if __name__ == "__main__":
     if CONFIG["GENERAL"]["MESSAGE_CONTENT_INTENT"]:
         intents = intents | interactions.Intents.MESSAGE_CONTENT
 
-    bot = interactions.Client(intents=intents)
+    if os.environ.get("DISCORD_API_BASE"):  # Like a local fake of the Discord API and gateway, for testing
+        Route.BASE = os.environ["DISCORD_API_BASE"]
+
+    with STARTUP_PROFILER.phase("create client"):
+        if shard_ids is not None and total_shards is not None:
+            bot = interactions.AutoShardedClient(
+                intents=intents,
+                shard_ids=[int(x) for x in shard_ids.split(",")],
+                total_shards=int(total_shards),
+                auto_defer=client_auto_defer(),
+                global_pre_run_callback=track_command,
+                **cache_kwargs(),
+            )
+        else:
+            bot = interactions.Client(
+                intents=intents,
+                auto_defer=client_auto_defer(),
+                global_pre_run_callback=track_command,
+                **cache_kwargs(),
+            )
+
+    COMMAND_METRICS.install(bot)
+    BOT_STATS.install(bot)
+    AUTO_DEFER_TRACKER.install(bot)
+    HTTP_CLIENT.install(bot)
+    ERROR_REPORTER.install(bot)
+
+    HTTP_CLIENT.limit = CONFIG["GENERAL"]["HTTP_CLIENT"]["LIMIT"]
+    HTTP_CLIENT.limit_per_host = CONFIG["GENERAL"]["HTTP_CLIENT"]["LIMIT_PER_HOST"]
+    HTTP_CLIENT.dns_cache_seconds = CONFIG["GENERAL"]["HTTP_CLIENT"]["DNS_CACHE_SECONDS"]
+    HTTP_CLIENT.keepalive_seconds = CONFIG["GENERAL"]["HTTP_CLIENT"]["KEEPALIVE_SECONDS"]
+    HTTP_CLIENT.timeout_seconds = CONFIG["GENERAL"]["HTTP_CLIENT"]["TIMEOUT_SECONDS"]
+    HTTP_CLIENT.cache_size = CONFIG["GENERAL"]["HTTP_CLIENT"]["CACHE_SIZE"]
+
+    WORK_POOL.threads = CONFIG["GENERAL"]["WORK_POOL"]["THREADS"]
+    WORK_POOL.processes = CONFIG["GENERAL"]["WORK_POOL"]["PROCESSES"]
+    WORK_POOL.max_queue = CONFIG["GENERAL"]["WORK_POOL"]["MAX_QUEUE"]
+
+    SCHEDULER.batch_size = CONFIG["GENERAL"]["SCHEDULER"]["BATCH_SIZE"]
+    SCHEDULER.concurrency = CONFIG["GENERAL"]["SCHEDULER"]["CONCURRENCY"]
+    if shard_ids is not None:  # Every worker keeps its own jobs, so they don't run twice
+        SCHEDULER.store_name = f"scheduled_jobs_shard_{shard_ids.split(',')[0]}"
 
     if CONFIG["GENERAL"]["TOKEN"] == "":
-        if len(sys.argv) > 1:
-            token = sys.argv[1]
+        if args:
+            token = args[0]
         else:
             token = input(
                 "Token is not set in config, please enter the token here.\n\nToken: "
@@ -37,22 +117,42 @@ if __name__ == "__main__":
         CONFIG["GENERAL"]["TOKEN"] = token
         CONFIG.save()
 
-    for extension in [
-        "extensions." + x.name.replace(".py", "")
-        for x in os.scandir("extensions")
-        if not x.name.startswith("_")
-    ]:
-        try:
-            bot.load_extension(extension)
-            print(f"Loaded: {extension}")
-        except Exception as e:
-            print(f"{e}")
+    EXTENSION_LOADER.load_all(
+        bot,
+        discover_extensions(),
+        parallel_imports=CONFIG["GENERAL"]["PARALLEL_EXTENSION_IMPORTS"],
+    )
+
+    hot_reloader = HotReloader()
+    metrics_server = MetricsServer(
+        bot, int(metrics_port) if metrics_port is not None else None
+    )
 
     @interactions.listen()
     async def on_startup():
         await bot.change_presence(activity=interactions.Activity("with Slash Commands"))
 
-        print(f"Online and Ready\nLogged in as {bot.user}")
+        logger.info(f"Online and Ready\nLogged in as {bot.user}")
+
+        if profile_startup:
+            STARTUP_PROFILER.write_report()
+            logger.info("Startup profile written to startup_profile.txt")
+
+        LOOP_MONITOR.threshold = CONFIG["GENERAL"]["LOOP_LAG_THRESHOLD_SECONDS"]
+        LOOP_MONITOR.report_threshold = CONFIG["GENERAL"]["LOOP_LAG_REPORT_SECONDS"]
+        LOOP_MONITOR.start(bot)
+
+        SCHEDULER.start()
+
+        if CONFIG["GENERAL"]["METRICS_SERVER"]["ENABLED"] or metrics_port is not None:
+            await metrics_server.start()
+            logger.info(
+                f"Metrics on http://{CONFIG['GENERAL']['METRICS_SERVER']['HOST']}:{metrics_server.port or CONFIG['GENERAL']['METRICS_SERVER']['PORT']}/metrics"
+            )
+
+        if CONFIG["GENERAL"]["HOT_RELOAD"]:
+            hot_reloader.start()
+            logger.info("Watching extensions/ and internal_tools/ for changes")
 
     @interactions.slash_command(
         name="reload-all",
@@ -61,21 +161,28 @@ if __name__ == "__main__":
     )
     @interactions.check(interactions.is_owner())
     async def reload_all_extensions(interaction: interactions.SlashContext):
-        usable_extensions = [
-            "extensions." + x.name.replace(".py", "")
-            for x in os.scandir("extensions")
-            if not x.name.startswith("_")
-        ]
-        for extension in usable_extensions:
-            try:
-                bot.unload_extension(extension)
-            except:
-                pass
-
-            bot.load_extension(extension)
+        EXTENSION_LOADER.reload_all(discover_extensions())
+        EXTENSION_CATALOG.invalidate()
 
         await interaction.send("Done", ephemeral=True)
 
+    @interactions.listen(interactions.api.events.CommandCompletion)
+    async def on_command_completion(event: interactions.api.events.CommandCompletion):
+        ctx = event.ctx
+        if not isinstance(ctx, interactions.InteractionContext):
+            return
+
+        latency = interactions.Timestamp.utcnow() - ctx.id.created_at
+
+        logger.info(
+            f"Command used: {ctx.invoke_target}",
+            extra={
+                "command": ctx.invoke_target,
+                "guild_id": ctx.guild_id,
+                "latency_ms": round(latency.total_seconds() * 1000, 1),
+            },
+        )
+
     async def _try_send(interaction: interactions.SlashContext, text: str):
         try:
             await interaction.send(
@@ -1,2 +1,3 @@
-del /s /q bot.spec bot.log .timetracker source_code.zip windows_installer.exe .\data\*.json
-rmdir /s /q dist\ build\ __pycache__\ extensions\__pycache__ internal_tools\__pycache__
\ No newline at end of file
+del /s /q bot.spec bot.log bot.log.* bot.worker-*.log* startup_profile.txt .timetracker source_code.zip windows_installer.exe .\data\*.json .\data\*.json.* .\data\*.sqlite3 .\data\*.sqlite3-* .\data\*.lock
+rmdir /s /q dist\ build\ __pycache__\ extensions\__pycache__ internal_tools\__pycache__
+for /d %%d in (.\data\*) do rmdir /s /q "%%d"
\ No newline at end of file
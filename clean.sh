@@ -1,2 +1,2 @@
-rm -f bot.spec bot.log .timetracker source_code.zip windows_installer.exe ./data/*.json
-rm -rf dist/ build/ __pycache__/ extensions/__pycache__ internal_tools/__pycache__
\ No newline at end of file
+rm -f bot.spec bot.log bot.log.* bot.worker-*.log* startup_profile.txt .timetracker source_code.zip windows_installer.exe ./data/*.json ./data/*.json.* ./data/*.sqlite3 ./data/*.sqlite3-* ./data/*.lock
+rm -rf dist/ build/ __pycache__/ extensions/__pycache__ internal_tools/__pycache__ ./data/*/
\ No newline at end of file
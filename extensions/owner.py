@@ -1,9 +1,52 @@
-import os
+import io
+from typing import List, Tuple
 
 import interactions
 
-from internal_tools.configuration import CONFIG
+from internal_tools.auto_defer import AUTO_DEFER_TRACKER, auto_defer
+from internal_tools.bot_stats import BOT_STATS
+from internal_tools.cache_policy import cache_report
+from internal_tools.command_metrics import COMMAND_METRICS, RESPONSE_DEADLINE
+from internal_tools.configuration import CONFIG, registered_stores
 from internal_tools.discord import fancy_embed
+from internal_tools.extension_loader import EXTENSION_CATALOG, EXTENSION_LOADER
+from internal_tools.http_client import HTTP_CLIENT
+from internal_tools.loop_monitor import LOOP_MONITOR
+from internal_tools.memory_profiler import (
+    MEMORY_PROFILER,
+    format_bytes,
+    object_counts,
+    store_sizes,
+)
+from internal_tools.scheduler import SCHEDULER
+from internal_tools.work_pool import WORK_POOL
+
+
+async def _send_table(
+    ctx: interactions.SlashContext,
+    title: str,
+    description: str,
+    rows: List[Tuple[str, str]],
+):
+    """
+    Sends the rows as embed fields, or as a text file if they don't fit into one embed.
+    """
+    if (
+        len(rows) <= 25
+        and all(len(name) <= 256 and len(value) <= 1024 for name, value in rows)
+        and len(title) + len(description) + sum(len(x) + len(y) for x, y in rows) < 5500
+    ):
+        await ctx.send(embed=fancy_embed(title=title, description=description, fields=dict(rows)))
+        return
+
+    content = "\n".join(f"{name}: {value}" for name, value in rows)
+    await ctx.send(
+        embed=fancy_embed(title=title, description=f"{description}\nToo much for an embed, see the file."),
+        file=interactions.File(
+            io.BytesIO(content.encode()),
+            file_name=f"{title.lower().replace(' ', '_')}.txt",
+        ),
+    )
 
 
 class Owner(interactions.Extension):
@@ -17,18 +60,18 @@ class Owner(interactions.Extension):
     async def extension_autocomplete(
         self, ctx: interactions.AutocompleteContext, extension: str
     ):
-        all_extensions = [
-            x.name.replace(".py", "")
-            for x in os.scandir("extensions/")
-            if x.is_file() and not x.name.startswith("_")
-        ]
-
-        if extension:
-            await ctx.send(
-                choices=[x for x in all_extensions if x.startswith(extension)]
-            )
-        else:
-            await ctx.send(choices=all_extensions)
+        choices = []
+        for name in EXTENSION_CATALOG.search(extension or ""):
+            if EXTENSION_LOADER.is_stub("extensions." + name):
+                label = f"{name} (lazy)"
+            elif EXTENSION_LOADER.is_loaded("extensions." + name):
+                label = f"{name} (loaded)"
+            else:
+                label = name
+
+            choices.append({"name": label, "value": name})
+
+        await ctx.send(choices=choices)
 
     @interactions.slash_command(
         name="owner-extension", scopes=CONFIG["GENERAL"]["OWNER_EXTENSION_GUILD_IDS"]
@@ -117,7 +160,8 @@ class Owner(interactions.Extension):
         Loads a Extension.
         """
         try:
-            self.bot.load_extension("extensions." + extension)
+            EXTENSION_LOADER.load("extensions." + extension)
+            EXTENSION_CATALOG.invalidate()
         except Exception as e:
             await ctx.send(f"**`ERROR:`** {type(e).__name__} - {e}")
         else:
@@ -142,7 +186,8 @@ class Owner(interactions.Extension):
         Unloads a Extension.
         """
         try:
-            self.bot.unload_extension("extensions." + extension)
+            EXTENSION_LOADER.unload("extensions." + extension)
+            EXTENSION_CATALOG.invalidate()
         except Exception as e:
             await ctx.send(f"**`ERROR:`** {type(e).__name__} - {e}")
         else:
@@ -167,8 +212,8 @@ class Owner(interactions.Extension):
         Reloads a Extension.
         """
         try:
-            self.bot.unload_extension("extensions." + extension)
-            self.bot.load_extension("extensions." + extension)
+            EXTENSION_LOADER.reload("extensions." + extension)
+            EXTENSION_CATALOG.invalidate()
         except Exception as e:
             await ctx.send(f"**`ERROR:`** {type(e).__name__} - {e}")
         else:
@@ -179,23 +224,321 @@ class Owner(interactions.Extension):
         sub_cmd_description="Shows info about the Bot and its stats",
     )
     async def show_info_and_stats(self, ctx: interactions.SlashContext):
-        await ctx.defer()
+        embed = fancy_embed(
+            title="Stats and Info",
+            fields={
+                "Server Amount": BOT_STATS.guilds,
+                "Approximate User Amount": BOT_STATS.members,
+                "Shards": BOT_STATS.shards,
+                "Servers joined / left in the last hour": f"{BOT_STATS.joins_last_hour} / {BOT_STATS.leaves_last_hour}",
+            },
+        )
+
+        await ctx.send(embed=embed)
+
+    @topcommand.subcommand(
+        sub_cmd_name="storage",
+        sub_cmd_description="Shows how often the data stores were changed and written",
+    )
+    async def show_storage_stats(self, ctx: interactions.SlashContext):
+        stores = sorted(
+            registered_stores(), key=lambda x: x.change_count, reverse=True
+        )[:25]
+
+        embed = fancy_embed(
+            title="Storage",
+            description="Stores with the most changes since startup",
+            fields={
+                store.filename: f"Changes: {store.change_count}\nWrites: {store.save_count}\nSkipped Saves: {store.skipped_saves}\nUnsaved Changes: {'Yes' if store.is_dirty else 'No'}"
+                for store in stores
+            },
+        )
+
+        await ctx.send(embed=embed)
+
+    @topcommand.subcommand(
+        sub_cmd_name="extensions",
+        sub_cmd_description="Shows how long each Extension took to load and how much memory it needed",
+    )
+    async def show_extension_stats(self, ctx: interactions.SlashContext):
+        fields = {}
 
-        guild_amount = 0
-        member_amount = 0
+        for extension, metrics in list(EXTENSION_LOADER.metrics.items())[:25]:
+            if metrics.loaded:
+                state = "Loaded"
+            elif metrics.lazy and metrics.setup_seconds is None:
+                state = "Lazy, not used yet"
+            else:
+                state = "Unloaded"
 
-        for g in self.bot.guilds:
-            guild_amount += 1
+            lines = [f"State: {state}"]
+            if metrics.import_seconds is not None:
+                lines.append(f"Import: {metrics.import_seconds * 1000:.1f} ms")
+            if metrics.setup_seconds is not None:
+                lines.append(f"Setup: {metrics.setup_seconds * 1000:.1f} ms")
+            if metrics.memory_delta is not None:
+                lines.append(f"Memory: {metrics.memory_delta / 1024 / 1024:+.1f} MB")
 
-            if g.member_count is not None:
-                member_amount += g.member_count
+            fields[extension.replace("extensions.", "", 1)] = "\n".join(lines)
 
+        embed = fancy_embed(title="Extensions", fields=fields)
+
+        await ctx.send(embed=embed)
+
+    @topcommand.subcommand(
+        sub_cmd_name="perf",
+        sub_cmd_description="Shows how fast the most used Commands answer (p50 / p95 / p99)",
+    )
+    async def show_command_perf(self, ctx: interactions.SlashContext):
         embed = fancy_embed(
-            title="Stats and Info",
+            title="Command Performance",
+            description=f"Most used Commands since startup. Discord drops answers that take longer than {RESPONSE_DEADLINE:.0f} s for the first response.",
+            fields={
+                name: f"Calls: {stats.calls} (Errors: {stats.errors})\nFirst Response: {stats.first_response.summary()}\nTotal: {stats.total.summary()}\nOver {RESPONSE_DEADLINE:.0f} s: {stats.late}, No Response: {stats.no_response}"
+                for name, stats in COMMAND_METRICS.hottest()
+            },
+        )
+
+        await ctx.send(embed=embed)
+
+    @topcommand.subcommand(
+        sub_cmd_name="lag",
+        sub_cmd_description="Shows the last times something blocked the Bot and what it was",
+    )
+    async def show_loop_lag(self, ctx: interactions.SlashContext):
+        embed = fancy_embed(
+            title="Event Loop Lag",
+            description=f"Right now: {LOOP_MONITOR.lag * 1000:.0f} ms, worst since startup: {LOOP_MONITOR.max_lag * 1000:.0f} ms",
+            fields={
+                f"{incident.started:%Y-%m-%d %H:%M:%S} - {incident.lag:.2f} s": f"{incident.culprit}\n```\n{incident.format_stack(limit=4)[-700:]}\n```"
+                for incident in LOOP_MONITOR.recent_incidents()[:5]
+            },
+        )
+
+        await ctx.send(embed=embed)
+
+    @topcommand.subcommand(
+        sub_cmd_name="caches",
+        sub_cmd_description="Shows how many entries each cache has and about how much memory it needs",
+    )
+    @auto_defer()
+    async def show_caches(self, ctx: interactions.SlashContext):
+        fields = {}
+        total = 0
+
+        for name, entries, estimate in cache_report(self.bot):
+            if estimate is None:
+                fields[name] = f"Entries: {entries}"
+            else:
+                total += estimate
+                fields[name] = f"Entries: {entries}\nMemory: ~{estimate / 1024 / 1024:.1f} MB"
+
+        embed = fancy_embed(
+            title="Caches",
+            description=f"About {total / 1024 / 1024:.1f} MB in total. Limits are set in CACHES in the GENERAL.json config.",
+            fields=fields,
+        )
+
+        await ctx.send(embed=embed)
+
+    @topcommand.subcommand(
+        sub_cmd_name="pool",
+        sub_cmd_description="Shows how busy the work pool for blocking functions is",
+    )
+    async def show_work_pool(self, ctx: interactions.SlashContext):
+        fields = {}
+
+        for kind, stats in WORK_POOL.stats.items():
+            utilization = WORK_POOL.utilization(kind)
+            if utilization is None:
+                fields[f"{kind.capitalize()}s"] = "Not used yet"
+            else:
+                fields[f"{kind.capitalize()}s"] = f"Workers: {stats.workers}\nRunning: {stats.running}\nCalls: {stats.calls}\nBusy: {utilization:.1%} since startup"
+
+        if WORK_POOL.running_by_name:
+            fields["Running per Function"] = "\n".join(
+                f"{name}: {amount}"
+                for name, amount in sorted(
+                    WORK_POOL.running_by_name.items(), key=lambda x: x[1], reverse=True
+                )[:10]
+            )
+
+        embed = fancy_embed(
+            title="Work Pool",
+            description=f"Waiting or running: {WORK_POOL.pending} / {WORK_POOL.max_queue}, rejected: {WORK_POOL.rejected}\nCommands deferred automatically: {AUTO_DEFER_TRACKER.deferred}",
+            fields=fields,
+        )
+
+        await ctx.send(embed=embed)
+
+    @topcommand.subcommand(
+        sub_cmd_name="http",
+        sub_cmd_description="Shows the requests to external APIs and how often the cache answered them",
+    )
+    async def show_http_stats(self, ctx: interactions.SlashContext):
+        hit_rate = HTTP_CLIENT.cache_hit_rate
+
+        embed = fancy_embed(
+            title="HTTP Client",
+            description=f"Cache hit rate: {'-' if hit_rate is None else f'{hit_rate:.1%}'} (Hits: {HTTP_CLIENT.cache_hits}, Revalidated: {HTTP_CLIENT.cache_revalidated}, Misses: {HTTP_CLIENT.cache_misses})",
+            fields={
+                host: f"Requests: {stats.requests} (Errors: {stats.errors})\nLatency: {stats.latency.summary()}"
+                for host, stats in sorted(
+                    HTTP_CLIENT.hosts.items(), key=lambda x: x[1].requests, reverse=True
+                )[:25]
+            },
+        )
+
+        await ctx.send(embed=embed)
+
+    @topcommand.subcommand(
+        sub_cmd_name="scheduler",
+        sub_cmd_description="Shows the scheduled jobs and how they ran",
+    )
+    async def show_scheduler(self, ctx: interactions.SlashContext):
+        waiting = {
+            name: len(job_ids)
+            for name, job_ids in SCHEDULER.waiting_for_handler.items()
+        }
+
+        embed = fancy_embed(
+            title="Scheduler",
+            description=f"Pending: {SCHEDULER.pending}\nRan: {SCHEDULER.dispatched} (Failed: {SCHEDULER.failed})\nLongest delay: {SCHEDULER.max_delay:.2f}s",
             fields={
-                "Server Amount": guild_amount,
-                "Approximate User Amount": member_amount,
+                "Handlers": ", ".join(sorted(SCHEDULER.handlers)) or "None",
+                "Waiting for a Handler": "\n".join(
+                    f"{name}: {amount}" for name, amount in waiting.items()
+                )
+                or "None",
             },
         )
 
         await ctx.send(embed=embed)
+
+    @topcommand.subcommand(
+        group_name="memory",
+        group_description="Memory profiling",
+        sub_cmd_name="start",
+        sub_cmd_description="Starts tracing memory allocations (slows the Bot down a bit until stopped)",
+    )
+    @interactions.slash_option(
+        name="frames",
+        description="How many frames of each allocation to keep (default 1)",
+        required=False,
+        opt_type=interactions.OptionType.INTEGER,
+        min_value=1,
+        max_value=25,
+    )
+    @auto_defer()
+    async def start_memory_tracing(self, ctx: interactions.SlashContext, frames: int = 1):
+        MEMORY_PROFILER.start(frames)
+        await ctx.send("Tracing memory allocations, a first snapshot was taken", ephemeral=True)
+
+    @topcommand.subcommand(
+        group_name="memory",
+        group_description="Memory profiling",
+        sub_cmd_name="stop",
+        sub_cmd_description="Stops tracing memory allocations",
+    )
+    async def stop_memory_tracing(self, ctx: interactions.SlashContext):
+        MEMORY_PROFILER.stop()
+        await ctx.send("Stopped tracing memory allocations", ephemeral=True)
+
+    @topcommand.subcommand(
+        group_name="memory",
+        group_description="Memory profiling",
+        sub_cmd_name="top",
+        sub_cmd_description="Shows the places in the code that hold the most memory",
+    )
+    @interactions.slash_option(
+        name="amount",
+        description="How many places to show (default 25, more are sent as a file)",
+        required=False,
+        opt_type=interactions.OptionType.INTEGER,
+        min_value=1,
+        max_value=500,
+    )
+    @auto_defer()
+    async def show_memory_top(self, ctx: interactions.SlashContext, amount: int = 25):
+        if not MEMORY_PROFILER.is_running:
+            await ctx.send("Memory tracing is not running, start it first", ephemeral=True)
+            return
+
+        current, peak = MEMORY_PROFILER.traced_memory()
+        await _send_table(
+            ctx,
+            "Memory Top",
+            f"Traced: {format_bytes(current)} (peak {format_bytes(peak)})",
+            MEMORY_PROFILER.top(amount),
+        )
+
+    @topcommand.subcommand(
+        group_name="memory",
+        group_description="Memory profiling",
+        sub_cmd_name="diff",
+        sub_cmd_description="Shows how the memory per place in the code changed since the last snapshot",
+    )
+    @interactions.slash_option(
+        name="amount",
+        description="How many places to show (default 25, more are sent as a file)",
+        required=False,
+        opt_type=interactions.OptionType.INTEGER,
+        min_value=1,
+        max_value=500,
+    )
+    @auto_defer()
+    async def show_memory_diff(self, ctx: interactions.SlashContext, amount: int = 25):
+        if not MEMORY_PROFILER.is_running:
+            await ctx.send("Memory tracing is not running, start it first", ephemeral=True)
+            return
+
+        await _send_table(
+            ctx,
+            "Memory Diff",
+            "Biggest changes since the last snapshot (start, top or diff)",
+            MEMORY_PROFILER.diff(amount),
+        )
+
+    @topcommand.subcommand(
+        group_name="memory",
+        group_description="Memory profiling",
+        sub_cmd_name="types",
+        sub_cmd_description="Shows which types of objects exist most often",
+    )
+    @interactions.slash_option(
+        name="amount",
+        description="How many types to show (default 25, more are sent as a file)",
+        required=False,
+        opt_type=interactions.OptionType.INTEGER,
+        min_value=1,
+        max_value=500,
+    )
+    @auto_defer()
+    async def show_object_counts(self, ctx: interactions.SlashContext, amount: int = 25):
+        await _send_table(
+            ctx,
+            "Object Types",
+            "Objects per type, without the ones the garbage collector doesn't track (like str and int)",
+            [(name, str(count)) for name, count in object_counts(amount)],
+        )
+
+    @topcommand.subcommand(
+        group_name="memory",
+        group_description="Memory profiling",
+        sub_cmd_name="stores",
+        sub_cmd_description="Shows how big each data store is in memory and on disk",
+    )
+    @auto_defer()
+    async def show_store_sizes(self, ctx: interactions.SlashContext):
+        await _send_table(
+            ctx,
+            "Store Sizes",
+            "Config and data stores, biggest in memory first",
+            [
+                (
+                    filename,
+                    f"Memory: {'not loaded' if memory is None else format_bytes(memory)}\nDisk: {format_bytes(disk)}",
+                )
+                for filename, disk, memory in store_sizes()
+            ],
+        )
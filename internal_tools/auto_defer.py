@@ -0,0 +1,103 @@
+import asyncio
+from typing import Callable, Dict, Optional, TypeVar
+
+import interactions
+
+from internal_tools.configuration import CONFIG
+
+__all__ = ["AUTO_DEFER_TRACKER", "BudgetAutoDefer", "auto_defer", "client_auto_defer"]
+__reloadable__ = False
+
+T = TypeVar("T")
+
+
+class AutoDeferTracker:
+    """
+    Keeps the deferrals that are still waiting, so they are cancelled when the Command finishes before its time is up. Also counts how often deferring was needed.
+    """
+
+    def __init__(self) -> None:
+        self.timers: Dict[int, asyncio.TimerHandle] = {}
+        self.deferred = 0
+
+    def install(self, bot: interactions.Client):
+        for event in (
+            interactions.api.events.CommandCompletion,
+            interactions.api.events.CommandError,
+        ):
+            bot.add_listener(interactions.listen(event)(self._on_finish))
+
+    async def _on_finish(self, event):
+        timer = self.timers.pop(int(event.ctx.id), None)
+        if timer is not None:
+            timer.cancel()
+
+
+AUTO_DEFER_TRACKER = AutoDeferTracker()
+
+
+class BudgetAutoDefer(interactions.AutoDefer):
+    """
+    Defers a Command that hasn't responded within time_until_defer seconds, so slow ones don't miss the 3 second deadline of Discord.
+    Unlike the AutoDefer of interactions.py, nothing is sent for Commands that responded or finished within the time.
+
+    Note: The response after deferring is ephemeral only if the deferral was, no matter what send() is told.
+    """
+
+    async def __call__(self, ctx: interactions.InteractionContext) -> None:
+        if not self.enabled:
+            return
+
+        if self.time_until_defer <= 0:
+            await self.defer(ctx)
+            return
+
+        loop = asyncio.get_running_loop()
+        AUTO_DEFER_TRACKER.timers[int(ctx.id)] = loop.call_later(
+            self.time_until_defer, self._defer_later, ctx
+        )
+
+    def _defer_later(self, ctx: interactions.InteractionContext):
+        AUTO_DEFER_TRACKER.timers.pop(int(ctx.id), None)
+        asyncio.create_task(self.defer(ctx))
+
+    async def defer(self, ctx: interactions.InteractionContext) -> None:
+        if ctx.responded or ctx.deferred:
+            return
+
+        await ctx.defer(ephemeral=self.ephemeral, suppress_error=True)
+        AUTO_DEFER_TRACKER.deferred += 1
+
+
+def client_auto_defer() -> BudgetAutoDefer:
+    """
+    The auto defer for all Commands of the client, as set in AUTO_DEFER in the GENERAL.json config.
+    """
+    config = CONFIG["GENERAL"]["AUTO_DEFER"]
+
+    return BudgetAutoDefer(
+        enabled=config["ENABLED"],
+        ephemeral=config["EPHEMERAL"],
+        time_until_defer=config["SECONDS"],
+    )
+
+
+def auto_defer(
+    seconds: Optional[float] = None, ephemeral: bool = False
+) -> Callable[[T], T]:
+    """
+    Defers this Command if it hasn't responded within seconds (by default SECONDS of AUTO_DEFER in the GENERAL.json config), even if AUTO_DEFER is disabled.
+    Has to be put below the slash_command / subcommand decorator.
+    """
+
+    def decorator(func: T) -> T:
+        func.auto_defer = BudgetAutoDefer(  # type: ignore
+            enabled=True,
+            ephemeral=ephemeral,
+            time_until_defer=(
+                CONFIG["GENERAL"]["AUTO_DEFER"]["SECONDS"] if seconds is None else seconds
+            ),
+        )
+        return func
+
+    return decorator
@@ -0,0 +1,128 @@
+import time
+from typing import Dict, List, Optional
+
+import interactions
+
+__all__ = ["BOT_STATS", "BotStats"]
+__reloadable__ = False
+
+
+class _HourlyCounter:
+    """
+    Counts events of the last hour in 60 buckets of one minute, so adding and reading stay constant time.
+    """
+
+    __slots__ = ("buckets", "minutes")
+
+    def __init__(self) -> None:
+        self.buckets: List[int] = [0] * 60
+        self.minutes: List[int] = [0] * 60
+
+    def add(self, amount: int = 1):
+        minute = int(time.time() // 60)
+        index = minute % 60
+        if self.minutes[index] != minute:
+            self.minutes[index] = minute
+            self.buckets[index] = 0
+        self.buckets[index] += amount
+
+    def last_hour(self) -> int:
+        minute = int(time.time() // 60)
+        return sum(
+            amount
+            for amount, bucket_minute in zip(self.buckets, self.minutes)
+            if minute - bucket_minute < 60
+        )
+
+
+class BotStats:
+    """
+    Guild and member numbers kept up to date from gateway events, so reading them doesn't have to go over all guilds.
+
+    Members are the member_count Discord sends with each guild, counted up and down with member add/remove events (those need the members intent, without it the numbers are only updated when a guild becomes available again).
+    Guilds that come in while starting are counted, but only guilds joined or left after the Bot is ready count as joins and leaves.
+    """
+
+    def __init__(self) -> None:
+        self.guilds = 0
+        self.members = 0
+        self.joins = _HourlyCounter()
+        self.leaves = _HourlyCounter()
+
+        self._member_counts: Dict[int, int] = {}
+        self._bot: Optional[interactions.Client] = None
+
+    @property
+    def shards(self) -> int:
+        return getattr(self._bot, "total_shards", 1)
+
+    @property
+    def joins_last_hour(self) -> int:
+        return self.joins.last_hour()
+
+    @property
+    def leaves_last_hour(self) -> int:
+        return self.leaves.last_hour()
+
+    def install(self, bot: interactions.Client):
+        self._bot = bot
+
+        for event, callback in (
+            (interactions.api.events.GuildJoin, self._on_guild_join),
+            (interactions.api.events.GuildAvailable, self._on_guild_available),
+            (interactions.api.events.GuildLeft, self._on_guild_left),
+            (interactions.api.events.MemberAdd, self._on_member_add),
+            (interactions.api.events.MemberRemove, self._on_member_remove),
+        ):
+            bot.add_listener(interactions.listen(event)(callback))
+
+    def _set_member_count(self, guild_id: int, member_count: int):
+        self.members += member_count - self._member_counts.get(guild_id, 0)
+        self._member_counts[guild_id] = member_count
+
+    def _guild_member_count(self, guild_id: int) -> int:
+        assert self._bot is not None
+
+        guild = self._bot.cache.get_guild(guild_id)
+        if guild is None or not guild.member_count:
+            return 0
+
+        return guild.member_count
+
+    async def _on_guild_join(self, event: interactions.api.events.GuildJoin):
+        guild_id = int(event.guild_id)
+        if guild_id not in self._member_counts:
+            self.guilds += 1
+            if self._bot is not None and self._bot.is_ready:
+                self.joins.add()
+
+        self._set_member_count(guild_id, self._guild_member_count(guild_id))
+
+    async def _on_guild_available(self, event: interactions.api.events.GuildAvailable):
+        guild_id = int(event.guild_id)
+        if guild_id not in self._member_counts:
+            self.guilds += 1
+
+        self._set_member_count(guild_id, self._guild_member_count(guild_id))
+
+    async def _on_guild_left(self, event: interactions.api.events.GuildLeft):
+        guild_id = int(event.guild_id)
+        if guild_id in self._member_counts:
+            self.guilds -= 1
+            self.members -= self._member_counts.pop(guild_id)
+            self.leaves.add()
+
+    async def _on_member_add(self, event: interactions.api.events.MemberAdd):
+        guild_id = int(event.guild_id)
+        if guild_id in self._member_counts:
+            self._member_counts[guild_id] += 1
+            self.members += 1
+
+    async def _on_member_remove(self, event: interactions.api.events.MemberRemove):
+        guild_id = int(event.guild_id)
+        if guild_id in self._member_counts:
+            self._member_counts[guild_id] -= 1
+            self.members -= 1
+
+
+BOT_STATS = BotStats()
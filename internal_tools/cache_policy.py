@@ -0,0 +1,124 @@
+import enum
+import itertools
+import sys
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+import interactions
+from interactions.client.smart_cache import create_cache
+from interactions.client.utils.cache import TTLCache
+
+from internal_tools.configuration import CONFIG
+
+__all__ = ["cache_kwargs", "cache_report"]
+
+# Config name -> attribute of interactions.Client.cache
+CACHES = {
+    "USER": "user_cache",
+    "MEMBER": "member_cache",
+    "MESSAGE": "message_cache",
+    "ROLE": "role_cache",
+    "VOICE_STATE": "voice_state_cache",
+    "SCHEDULED_EVENT": "scheduled_events_cache",
+    "DM_CHANNEL": "dm_channels",
+    "USER_GUILDS": "user_guilds",
+}
+
+_SAMPLE_SIZE = 20
+
+
+def cache_kwargs() -> Dict[str, Any]:
+    """
+    Client keyword arguments for the caches as set in CACHES in the GENERAL.json config.
+
+    Per cache: ENABLED (false keeps nothing at all), HARD_LIMIT (most entries), SOFT_LIMIT (entries above this expire after TTL_SECONDS). null means no limit, for SOFT_LIMIT that all entries expire after TTL_SECONDS.
+    With no limit and no TTL, the cache is a plain dict, like the interactions.py default for most of them.
+    Guilds and channels are always cached, too much depends on them.
+    """
+    kwargs = {}
+
+    for name, attribute in CACHES.items():
+        policy = CONFIG["GENERAL"]["CACHES"].get(name)
+        if policy is None:
+            continue
+
+        if not policy["ENABLED"]:
+            kwargs[attribute] = create_cache(0, 0, 0)
+        else:
+            cache = create_cache(
+                ttl=policy["TTL_SECONDS"],
+                hard_limit=policy["HARD_LIMIT"],
+                soft_limit=policy["SOFT_LIMIT"],
+            )
+            if isinstance(cache, TTLCache) and policy["SOFT_LIMIT"] is None:
+                cache.soft_limit = 0  # create_cache() would keep 50 (or HARD_LIMIT / 4) entries from expiring
+
+            kwargs[attribute] = cache
+
+    return kwargs
+
+
+def _deep_size(obj: Any, seen: Set[int], depth: int = 0) -> int:
+    """
+    Rough size of an object and what it holds. References back to the client and into other cached objects (depth > 4) are not followed.
+    """
+    if id(obj) in seen or depth > 4:
+        return 0
+    if isinstance(obj, (type, enum.Enum, interactions.Client)) or callable(obj):
+        return 0
+    seen.add(id(obj))
+
+    size = sys.getsizeof(obj)
+
+    if isinstance(obj, dict):
+        size += sum(
+            _deep_size(k, seen, depth + 1) + _deep_size(v, seen, depth + 1)
+            for k, v in obj.items()
+        )
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(_deep_size(x, seen, depth + 1) for x in obj)
+    elif not isinstance(obj, (str, bytes, int, float, bool)) and obj is not None:
+        attributes = getattr(obj, "__dict__", None)
+        if attributes is None:
+            attributes = {
+                x: getattr(obj, x, None)
+                for cls in type(obj).__mro__
+                for x in getattr(cls, "__slots__", ())
+            }
+        size += sum(
+            _deep_size(v, seen, depth + 1)
+            for k, v in attributes.items()
+            if k != "_client"
+        )
+
+    return size
+
+
+def cache_report(bot: interactions.Client) -> List[Tuple[str, int, Optional[int]]]:
+    """
+    Name, amount of entries and estimated bytes of every cache of the client.
+    The size is measured on the first few entries and multiplied, so it is only an estimate (and None for empty caches).
+    """
+    report = []
+
+    for attribute in [
+        "guild_cache",
+        "channel_cache",
+        *CACHES.values(),
+        "bot_voice_state_cache",
+        "emoji_cache",
+    ]:
+        cache = getattr(bot.cache, attribute, None)
+        if cache is None:
+            continue
+
+        entries = len(cache)
+        estimate = None
+        if entries:
+            sample = list(itertools.islice(cache.values(), _SAMPLE_SIZE))
+            seen: Set[int] = set()  # Objects shared between entries are only counted once
+            sample_size = sum(_deep_size(x, seen) for x in sample)
+            estimate = sys.getsizeof(cache) + sample_size * entries // len(sample)
+
+        report.append((attribute, entries, estimate))
+
+    return report
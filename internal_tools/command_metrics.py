@@ -0,0 +1,209 @@
+import bisect
+import re
+import time
+from typing import Dict, List, Optional, Tuple
+
+import interactions
+
+__all__ = ["COMMAND_METRICS", "CommandStats", "LatencyHistogram"]
+__reloadable__ = False
+
+# Discord drops interactions that don't get a first response within this time
+RESPONSE_DEADLINE = 3.0
+
+
+def _bucket_bounds() -> List[float]:
+    bounds = []
+    bound = 0.001
+    while bound < 60:
+        bounds.append(bound)
+        bound *= 1.1
+
+    return bounds
+
+
+class LatencyHistogram:
+    """
+    Counts durations into fixed buckets that grow by 10% from 1 ms to 60 s, so it needs the same memory no matter how often something was measured.
+    Percentiles are given as the upper end of their bucket, so they are at most 10% too high.
+    """
+
+    __slots__ = ("counts", "count", "total")
+
+    bounds = _bucket_bounds()
+
+    def __init__(self) -> None:
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+
+    def add(self, seconds: float):
+        self.counts[bisect.bisect_left(self.bounds, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+
+    def percentile(self, percent: float) -> Optional[float]:
+        if self.count == 0:
+            return None
+
+        wanted = self.count * percent / 100
+        seen = 0
+        for index, amount in enumerate(self.counts):
+            seen += amount
+            if seen >= wanted:
+                return self.bounds[index] if index < len(self.bounds) else float("inf")
+
+        return float("inf")
+
+    def summary(self) -> str:
+        if self.count == 0:
+            return "-"
+
+        return " / ".join(
+            _format_seconds(self.percentile(x)) for x in (50, 95, 99)  # type: ignore
+        )
+
+
+def _format_seconds(seconds: float) -> str:
+    if seconds == float("inf"):
+        return "> 60 s"
+    if seconds >= 1:
+        return f"{seconds:.2f} s"
+
+    return f"{seconds * 1000:.0f} ms"
+
+
+class CommandStats:
+    __slots__ = ("first_response", "total", "errors", "no_response", "late")
+
+    def __init__(self) -> None:
+        self.first_response = LatencyHistogram()
+        self.total = LatencyHistogram()
+        self.errors = 0
+        self.no_response = 0
+        self.late = 0
+
+    @property
+    def calls(self) -> int:
+        return self.total.count
+
+
+class CommandMetrics:
+    """
+    Measures every slash command, autocomplete and component callback: time to the first response (defer or send), the total time of the handler and whether it failed.
+
+    install() hooks into the client instead of every single command:
+    - The global pre run callback marks the start.
+    - The initial response of every interaction goes through HTTPClient.post_initial_response, that is where the first response is seen.
+    - The completion and error events mark the end.
+
+    At most max_commands names are kept, everything after that is counted as "other", so the memory can't grow without a limit (component IDs can contain changing numbers, those are replaced with #).
+    """
+
+    def __init__(self, max_commands: int = 500) -> None:
+        self.max_commands = max_commands
+        self.stats: Dict[str, CommandStats] = {}
+        self.errors_by_type: Dict[str, int] = {}
+
+        self._running: Dict[int, Tuple[str, float]] = {}
+        self._responded: Dict[int, float] = {}
+        self._failed = set()
+
+    def install(self, bot: interactions.Client):
+        previous_pre_run = bot.pre_run_callback
+
+        async def pre_run_callback(ctx: interactions.BaseContext, *args, **kwargs):
+            self.start(ctx)
+
+            if previous_pre_run:
+                await previous_pre_run(ctx, *args, **kwargs)
+
+        bot.pre_run_callback = pre_run_callback
+
+        post_initial_response = bot.http.post_initial_response
+
+        async def timed_post_initial_response(payload, interaction_id, *args, **kwargs):
+            if int(interaction_id) in self._running:
+                self._responded.setdefault(int(interaction_id), time.perf_counter())
+            return await post_initial_response(payload, interaction_id, *args, **kwargs)
+
+        bot.http.post_initial_response = timed_post_initial_response  # type: ignore
+
+        for event in (
+            interactions.api.events.CommandCompletion,
+            interactions.api.events.AutocompleteCompletion,
+            interactions.api.events.ComponentCompletion,
+        ):
+            bot.add_listener(interactions.listen(event)(self._on_completion))
+
+        for event in (
+            interactions.api.events.CommandError,
+            interactions.api.events.AutocompleteError,
+            interactions.api.events.ComponentError,
+        ):
+            bot.add_listener(interactions.listen(event)(self._on_error))
+
+    def name_of(self, ctx: interactions.BaseContext) -> str:
+        if isinstance(ctx, interactions.AutocompleteContext):
+            return f"{ctx.invoke_target} (autocomplete)"
+        if isinstance(ctx, interactions.ComponentContext):
+            return f"component {re.sub(r'[0-9]+', '#', ctx.custom_id)}"
+
+        return ctx.invoke_target  # type: ignore
+
+    def start(self, ctx: interactions.BaseContext):
+        if isinstance(ctx, interactions.ModalContext):
+            return  # Modals have no completion event to end the measurement
+
+        if len(self._running) >= 10_000:  # Never finished, like cancelled ones
+            self._running.pop(next(iter(self._running)))
+
+        self._running[int(ctx.id)] = (self.name_of(ctx), time.perf_counter())  # type: ignore
+
+    async def _on_error(self, event):
+        self._failed.add(int(event.ctx.id))
+
+        error_type = type(event.error).__name__
+        if error_type in self.errors_by_type or len(self.errors_by_type) < self.max_commands:
+            self.errors_by_type[error_type] = self.errors_by_type.get(error_type, 0) + 1
+
+    async def _on_completion(self, event):
+        self.finish(int(event.ctx.id))
+
+    def finish(self, interaction_id: int):
+        end = time.perf_counter()
+
+        running = self._running.pop(interaction_id, None)
+        responded = self._responded.pop(interaction_id, None)
+        failed = interaction_id in self._failed
+        self._failed.discard(interaction_id)
+
+        if running is None:
+            return
+
+        name, start = running
+        stats = self.stats.get(name)
+        if stats is None:
+            if len(self.stats) >= self.max_commands:
+                name = "other"
+            stats = self.stats.setdefault(name, CommandStats())
+
+        stats.total.add(end - start)
+        if failed:
+            stats.errors += 1
+
+        if responded is None:
+            stats.no_response += 1
+        else:
+            first_response = max(responded - start, 0.0)
+            stats.first_response.add(first_response)
+            if first_response >= RESPONSE_DEADLINE:
+                stats.late += 1
+
+    def hottest(self, amount: int = 25) -> List[Tuple[str, CommandStats]]:
+        return sorted(self.stats.items(), key=lambda x: x[1].calls, reverse=True)[
+            :amount
+        ]
+
+
+COMMAND_METRICS = CommandMetrics()
@@ -1,18 +1,631 @@
+import asyncio
+import atexit
+import contextlib
+import copy
 import datetime
+import gzip
+import logging
 import os
 import re
+import sqlite3
+import threading
+import time
 import uuid
-from collections import UserDict
-from functools import reduce
-from typing import Any, Callable, Dict, List, Literal, Optional
+import weakref
+import zlib
+from collections import OrderedDict, UserDict
+from collections.abc import MutableMapping
+from functools import lru_cache, reduce
+from typing import Any, Callable, Dict, List, Literal, Optional, Sequence, Union
 
 import orjson
 
-__all__ = ["CONFIG", "JsonDictSaver"]
+from internal_tools.store_index import StoreIndex
+
+try:
+    import zstandard
+except ImportError:  # Only needed for file_format="zstd"
+    zstandard = None
+
+if os.name == "nt":
+    import msvcrt
+else:
+    import fcntl
+
+__all__ = ["CONFIG", "JsonDictSaver", "ShardedJsonDictSaver", "registered_stores"]
+__reloadable__ = False
+
+logger = logging.getLogger("DiscordBot")
 
 if not os.path.isdir("data"):
     os.mkdir("data")
 
+# Set by supervisor.py for its workers, which all use the same data/ folder
+_SHARED_DATA = os.environ.get("BOT_SHARED_DATA") == "1"
+
+
+_stores: "weakref.WeakValueDictionary[str, JsonDictSaver]" = (
+    weakref.WeakValueDictionary()
+)
+
+
+def registered_stores() -> List["JsonDictSaver"]:
+    """
+    Gives back all JsonDictSavers that currently exist, including the ones of CONFIG and the ones made by extensions.
+    """
+    return list(_stores.values())
+
+
+# By id(), as stores aren't hashable. Weak, so stores that aren't used anymore (like dropped shards) can still be freed
+_write_behind_stores: "weakref.WeakValueDictionary[int, JsonDictSaver]" = (
+    weakref.WeakValueDictionary()
+)
+
+
+@atexit.register
+def _flush_write_behind_stores():
+    for store in list(_write_behind_stores.values()):
+        store.flush()
+
+
+_FORMAT_SUFFIXES = {
+    "json": ".json",
+    "compact": ".json",
+    "gzip": ".json.gz",
+    "zstd": ".json.zst",
+}
+_GZIP_MAGIC = b"\x1f\x8b"
+_ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+
+
+def _decode(content: bytes) -> Any:
+    """
+    Parses the content of a data file, no matter which file_format it was written with.
+    """
+    if content.startswith(_GZIP_MAGIC):
+        content = gzip.decompress(content)
+    elif content.startswith(_ZSTD_MAGIC):
+        if zstandard is None:
+            raise ImportError("Reading zstd compressed files needs the zstandard package")
+
+        content = zstandard.ZstdDecompressor().decompressobj().decompress(content)
+
+    return orjson.loads(content)
+
+
+def _atomic_write(filename: str, content: bytes):
+    """
+    Writes to a temporary file next to the target and renames it over the target, so a crash mid-write never leaves a truncated file behind.
+    """
+    tmp_filename = f"{filename}.tmp"
+
+    with open(tmp_filename, "wb") as f:
+        f.write(content)
+        f.flush()
+        os.fsync(f.fileno())
+
+    os.replace(tmp_filename, filename)
+
+
+@contextlib.contextmanager
+def _file_lock(filename: str):
+    """
+    Lock on "<file>.lock" that is held across processes. Only taken if the data folder is shared with other processes, threads of one process are kept apart by the _write_lock of the store already.
+    Not reentrant, a process that takes it twice for the same file blocks itself.
+    """
+    if not _SHARED_DATA:
+        yield
+        return
+
+    with open(f"{filename}.lock", "a+b") as f:
+        if os.name == "nt":
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+        else:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+
+        try:
+            yield
+        finally:
+            if os.name == "nt":
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+            else:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+def _file_identity(filename: str) -> Optional[tuple]:
+    """
+    Changes with every write, as _atomic_write always puts a new file in place.
+    """
+    try:
+        stat = os.stat(filename)
+    except FileNotFoundError:
+        return None
+
+    return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+
+def _raw_key(key: Any) -> str:
+    """
+    Gives back the string a key turns into when it is written as a JSON object key.
+    """
+    return next(iter(orjson.loads(orjson.dumps({key: None}, option=orjson.OPT_NON_STR_KEYS))))
+
+
+_DATETIME_PATTERN = re.compile(r"\d{1,4}-\d{1,2}-\d{1,2}T\d{1,2}:\d{1,2}:\d{1,2}")
+_DATE_PATTERN = re.compile(r"\d{1,4}-\d{1,2}-\d{1,2}")
+_TIME_PATTERN = re.compile(r"\d{1,2}:\d{1,2}:\d{1,2}")
+_UUID_PATTERN = re.compile(
+    r"[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}"
+)
+_DIGITS = frozenset("0123456789")
+_HEX_LETTERS = frozenset("abcdefABCDEF")
+_LITERALS = {"true": True, "false": False, "null": None}
+
+
+@lru_cache(maxsize=65536)
+def _convert_string(val: str) -> Any:
+    """
+    Converts a string from a JSON file back to the type it had before saving. Strings that don't look like anything else are given back as they are.
+    The first character decides which checks can apply at all, so most strings never reach a regex.
+    All results are immutable, which is why they can be cached.
+    """
+    first = val[:1]
+
+    if first in _DIGITS or first == ".":
+        if val.isdigit() and val.isascii():
+            return int(val)
+
+        if val.count(".") == 1:
+            digits = val.replace(".", "")
+            if digits.isdigit() and digits.isascii():
+                return float(val)
+
+        if first == ".":
+            return val
+
+        try:
+            if len(val) >= 11 and _DATETIME_PATTERN.match(val):
+                return datetime.datetime.fromisoformat(val)
+
+            if len(val) >= 5 and _DATE_PATTERN.match(val):
+                return datetime.date.fromisoformat(val)
+
+            if len(val) >= 5 and _TIME_PATTERN.match(val):
+                return datetime.time.fromisoformat(val)
+
+            if len(val) >= 36 and _UUID_PATTERN.match(val):
+                return uuid.UUID(f"{{{val}}}")
+        except ValueError:
+            pass  # Only starts like one of them, it is just a string
+
+        return val
+
+    if first in _HEX_LETTERS and len(val) >= 36 and _UUID_PATTERN.match(val):
+        try:
+            return uuid.UUID(f"{{{val}}}")
+        except ValueError:
+            return val
+
+    return _LITERALS.get(val, val)
+
+
+class _ChangeTracker:
+    """
+    Reports changes below one top-level key to its store. Shared by all tracked containers under that key.
+    """
+
+    __slots__ = ("store", "key")
+
+    def __init__(self, store: "JsonDictSaver", key: Any) -> None:
+        self.store = store
+        self.key = key
+
+    def __call__(self):
+        self.store._mark_changed(self.key)
+
+    def __eq__(self, other: Any) -> bool:
+        return (
+            isinstance(other, _ChangeTracker)
+            and other.store is self.store
+            and other.key == self.key
+        )
+
+
+class _TrackedDict(dict):
+    """
+    dict that reports every change to the store it is in. Dicts and lists put into it are tracked too.
+    """
+
+    __slots__ = ("_on_change", "__weakref__")
+
+    def __setitem__(self, key: Any, value: Any) -> None:
+        dict.__setitem__(self, key, _convert_data(value, self._on_change, False))
+        self._on_change()
+
+    def __delitem__(self, key: Any) -> None:
+        dict.__delitem__(self, key)
+        self._on_change()
+
+    def __ior__(self, other: Any):
+        self.update(other)
+        return self
+
+    def clear(self):
+        dict.clear(self)
+        self._on_change()
+
+    def pop(self, *args):
+        value = dict.pop(self, *args)
+        self._on_change()
+        return value
+
+    def popitem(self):
+        item = dict.popitem(self)
+        self._on_change()
+        return item
+
+    def setdefault(self, key: Any, default: Any = None) -> Any:
+        if key not in self:
+            self[key] = default
+
+        return dict.__getitem__(self, key)
+
+    def update(self, *args, **kwargs):
+        for key, value in dict(*args, **kwargs).items():
+            dict.__setitem__(self, key, _convert_data(value, self._on_change, False))
+
+        self._on_change()
+
+    def __copy__(self):
+        return dict(self)
+
+    def __deepcopy__(self, memo):
+        return copy.deepcopy(dict(self), memo)
+
+    def __reduce__(self):
+        return (dict, (dict(self),))
+
+
+class _TrackedList(list):
+    """
+    list that reports every change to the store it is in. Dicts and lists put into it are tracked too.
+    """
+
+    __slots__ = ("_on_change", "__weakref__")
+
+    def _track(self, value: Any) -> Any:
+        return _convert_data(value, self._on_change, False)
+
+    def __setitem__(self, index: Any, value: Any) -> None:
+        if isinstance(index, slice):
+            value = [self._track(v) for v in value]
+        else:
+            value = self._track(value)
+
+        list.__setitem__(self, index, value)
+        self._on_change()
+
+    def __delitem__(self, index: Any) -> None:
+        list.__delitem__(self, index)
+        self._on_change()
+
+    def __iadd__(self, other: Any):
+        self.extend(other)
+        return self
+
+    def __imul__(self, other: Any):
+        list.__imul__(self, other)
+        self._on_change()
+        return self
+
+    def append(self, value: Any):
+        list.append(self, self._track(value))
+        self._on_change()
+
+    def extend(self, values: Any):
+        list.extend(self, [self._track(v) for v in values])
+        self._on_change()
+
+    def insert(self, index: Any, value: Any):
+        list.insert(self, index, self._track(value))
+        self._on_change()
+
+    def pop(self, *args):
+        value = list.pop(self, *args)
+        self._on_change()
+        return value
+
+    def remove(self, value: Any):
+        list.remove(self, value)
+        self._on_change()
+
+    def clear(self):
+        list.clear(self)
+        self._on_change()
+
+    def sort(self, *args, **kwargs):
+        list.sort(self, *args, **kwargs)
+        self._on_change()
+
+    def reverse(self):
+        list.reverse(self)
+        self._on_change()
+
+    def __copy__(self):
+        return list(self)
+
+    def __deepcopy__(self, memo):
+        return copy.deepcopy(list(self), memo)
+
+    def __reduce__(self):
+        return (list, (list(self),))
+
+
+def _new_container(
+    source: Any, on_change: Optional[_ChangeTracker]
+) -> Union[dict, list]:
+    if on_change is None:
+        return {} if isinstance(source, dict) else []
+
+    container = _TrackedDict() if isinstance(source, dict) else _TrackedList()
+    container._on_change = on_change
+    return container
+
+
+def _convert_data(
+    data: Any,
+    on_change: Optional[_ChangeTracker] = None,
+    convert_strings: bool = True,
+) -> Any:
+    """
+    Converts all keys and values of loaded JSON data (including values in lists) with _convert_string.
+    With on_change set, all dicts and lists are rebuilt as tracked containers that call it on every change. Containers that are already tracked by it are kept as they are.
+    Works with an explicit stack instead of recursion, so deeply nested data can't hit the recursion limit.
+    """
+    if isinstance(data, str):
+        return _convert_string(data) if convert_strings else data
+
+    if not isinstance(data, (dict, list)):
+        return data
+
+    if on_change is not None and getattr(data, "_on_change", None) == on_change:
+        return data
+
+    root = _new_container(data, on_change)
+    stack = [(data, root)]
+
+    while stack:
+        source, target = stack.pop()
+
+        if isinstance(source, dict):
+            items = source.items()
+        else:
+            items = enumerate(source)
+
+        target_is_dict = isinstance(target, dict)
+
+        for key, val in items:
+            val_type = type(val)
+
+            if val_type is str:
+                if convert_strings:
+                    val = _convert_string(val)
+            elif val_type is dict or val_type is list or isinstance(val, (dict, list)):
+                new_val = _new_container(val, on_change)
+                stack.append((val, new_val))
+                val = new_val
+
+            if target_is_dict:
+                if convert_strings:
+                    key = _convert_string(key)
+
+                dict.__setitem__(target, key, val)
+            else:
+                list.append(target, val)
+
+    return root
+
+
+class _SqliteMapping(MutableMapping):
+    """
+    Mapping that keeps every top-level key as a row in a SQLite file (WAL mode).
+    Only the keys are loaded up front, values are loaded the first time they are read and then kept in a bounded cache.
+    Changed keys are written in one transaction on commit(). Values that are dropped from the cache but still referenced somewhere are kept track of, so changes made through those references are still written.
+    """
+
+    def __init__(
+        self,
+        filename: str,
+        json_filename: str,
+        default: dict,
+        func_if_default: Optional[Callable],
+        convert_key: Callable[[Any], Any],
+        convert_value: Callable[[Any, Any], Any],
+        orjson_option: int,
+        cache_size: int,
+    ) -> None:
+        self.filename = filename
+        self.convert_key = convert_key
+        self.convert_value = convert_value
+        self.orjson_option = orjson_option
+        self.cache_size = cache_size
+
+        self._keys = {}
+        self._cache = OrderedDict()
+        self._evicted = weakref.WeakValueDictionary()  # Dropped from the cache, but still referenced somewhere
+        self._dirty = set()
+        self._lock = threading.RLock()  # For the state above, taken before _db_lock
+        self._db_lock = threading.Lock()
+
+        is_new = not os.path.exists(filename)
+
+        self._connection = sqlite3.connect(filename, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS data (key TEXT PRIMARY KEY, value BLOB NOT NULL) WITHOUT ROWID"
+        )
+
+        if is_new:
+            if os.path.exists(json_filename):
+                self._migrate_from_json(json_filename)
+            else:
+                self._insert_raw(default)
+
+                if func_if_default:
+                    func_if_default()
+
+        for (raw_key,) in self._connection.execute("SELECT key FROM data"):
+            self._keys[convert_key(raw_key)] = raw_key
+
+    def _insert_raw(self, data: dict):
+        with self._connection:
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO data VALUES (?, ?)",
+                (
+                    (_raw_key(k), orjson.dumps(v, option=self.orjson_option))
+                    for k, v in data.items()
+                ),
+            )
+
+    def _migrate_from_json(self, json_filename: str):
+        with open(json_filename, "rb") as f:
+            self._insert_raw(orjson.loads(f.read()))
+
+        os.replace(json_filename, f"{json_filename}.migrated")
+        logger.info(f"Migrated {json_filename} to {self.filename}")
+
+    def _load(self, key: Any, raw_value: bytes):
+        evicted = self._evicted.pop(key, None)
+        if evicted is not None:  # Still referenced somewhere, keep it the same object
+            self._cache[key] = evicted
+        else:
+            self._cache[key] = self.convert_value(key, orjson.loads(raw_value))
+
+    def __getitem__(self, key: Any) -> Any:
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+            elif key in self._evicted:
+                self._cache[key] = self._evicted.pop(key)
+            else:
+                raw_key = self._keys[key]
+
+                with self._db_lock:
+                    row = self._connection.execute(
+                        "SELECT value FROM data WHERE key = ?", (raw_key,)
+                    ).fetchone()
+
+                self._load(key, row[0])
+
+            return self._cache[key]
+
+    def preload(self, keys: Sequence[Any]):
+        """
+        Loads the values of keys that aren't cached yet with one query per 500 keys, instead of one per key.
+        """
+        with self._lock:
+            missing = {
+                self._keys[key]: key
+                for key in keys
+                if key in self._keys and key not in self._cache
+            }
+            raw_keys = list(missing)
+
+            for i in range(0, len(raw_keys), 500):  # SQLite limits the amount of parameters
+                chunk = raw_keys[i : i + 500]
+
+                with self._db_lock:
+                    rows = self._connection.execute(
+                        f"SELECT key, value FROM data WHERE key IN ({','.join('?' * len(chunk))})",
+                        chunk,
+                    ).fetchall()
+
+                for raw_key, value in rows:
+                    self._load(missing[raw_key], value)
+
+    def __setitem__(self, key: Any, value: Any) -> None:
+        with self._lock:
+            if key not in self._keys:
+                self._keys[key] = _raw_key(key)
+
+            self._evicted.pop(key, None)
+            self._cache[key] = value
+            self._cache.move_to_end(key)
+
+    def __delitem__(self, key: Any) -> None:
+        with self._lock:
+            del self._keys[key]
+            self._cache.pop(key, None)
+            self._evicted.pop(key, None)
+
+    def mark_dirty(self, key: Any):
+        with self._lock:
+            self._dirty.add(key)
+
+            # Changed through a reference to a value that was dropped from the cache already
+            if key not in self._cache and key in self._evicted:
+                self._cache[key] = self._evicted.pop(key)
+
+    def __contains__(self, key: Any) -> bool:
+        return key in self._keys
+
+    def __iter__(self):
+        return iter(list(self._keys))
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def commit(self):
+        """
+        Writes all keys marked with mark_dirty() in one transaction.
+        The values are serialized while holding the lock, so changes from other threads can't get in between. Writing them to the file happens without it.
+        The cache is only trimmed once the write went through, so keys of a failed write can be written again by the next commit.
+        """
+        with self._lock:
+            keys, self._dirty = self._dirty, set()
+            if not keys:
+                return
+
+            upserts = []
+            deletes = []
+            for key in keys:
+                if key in self._keys:
+                    upserts.append(
+                        (
+                            self._keys[key],
+                            orjson.dumps(self._cache[key], option=self.orjson_option),
+                        )
+                    )
+                else:
+                    deletes.append((_raw_key(key),))
+
+        try:
+            with self._db_lock, self._connection:
+                self._connection.executemany(
+                    "INSERT OR REPLACE INTO data VALUES (?, ?)", upserts
+                )
+                self._connection.executemany("DELETE FROM data WHERE key = ?", deletes)
+        except Exception:
+            with self._lock:
+                self._dirty |= keys  # Tried again on the next commit, their values are still cached
+
+            raise
+
+        with self._lock:
+            # Only after the write, values that are not waiting to be written can be loaded again when needed
+            for key in list(self._cache)[: max(len(self._cache) - self.cache_size, 0)]:
+                if key not in self._dirty:
+                    value = self._cache.pop(key)
+                    if isinstance(value, (_TrackedDict, _TrackedList)):
+                        self._evicted[key] = value
+
+    def close(self):
+        self.commit()
+        self._connection.close()
+
 
 class Config(UserDict):
     def __init__(self, categories: Dict[str, "JsonDictSaver"] = {}):
@@ -44,12 +657,44 @@ class Config(UserDict):
         for jds in self.values():
             jds.save()
 
+    def flush(self):
+        for jds in self.values():
+            jds.flush()
+
+    async def aflush(self):
+        await asyncio.gather(*[jds.aflush() for jds in self.values()])
+
 
 class JsonDictSaver(UserDict):
     """
     Note: If you enter a dataclass, you manually have to convert it from type dict after loading.
+
+    Changes are tracked, also inside nested dicts and lists (store["guild"]["x"] = y), so save() does nothing if nothing changed. See is_dirty and change_count.
+    For that, dicts and lists are copied into tracked versions when they are put into the store. Change them through the store, not through the object you put in.
+    Changes made through the object you put in until the next save() are still taken over by that save(), with a warning in the log. Changes after it are not seen anymore.
+
+    With write_behind=True, save() only marks the store as dirty. All saves within flush_interval seconds are merged into one write that happens in a worker thread.
+    Call flush() or aflush() on shutdown to write pending changes right away. (Pending changes are also flushed when the interpreter exits normally)
+
+    With storage="journal", save() appends one compact record per changed top-level key to a "<file>.log" sidecar instead of rewriting the whole file.
+    Loading replays the snapshot plus the log, and the snapshot is compacted in a background thread once the log gets too big.
+
+    With storage="sqlite", every top-level key is a row in "<name>.sqlite3" instead. Values are loaded on first access and save() writes only the touched keys, in one transaction.
+    An existing "<name>.json" file is migrated automatically the first time (and renamed to "<name>.json.migrated").
+
+    With lazy=True, the file is only read on first access. Dicts and lists in the top level are converted the first time their key is read.
+    add_index() makes a secondary index over a value path or the result of a function, for lookups by value (equal, range, prefix) without going over every key. Indexes are kept in memory only, they are built from all values (loading lazy and sqlite stores completely) and updated on every change.
+    defaults_from fills in missing top-level keys from another store when loading, and saves if that added anything.
+
+    file_format="compact" writes orjson without indentation, "gzip" and "zstd" compress that as well (zstd needs the zstandard package). The file ending changes with it (.json, .json.gz, .json.zst).
+    The format is detected when loading, files in another format are converted on load and the old file is removed.
+
+    Workers started by supervisor.py share the data folder. There, every write holds a lock across the processes, and before writing a snapshot the top-level keys other processes wrote in the meantime are taken over, so processes that change different keys (like different guilds) don't overwrite each other. If two processes change the same key, the last write wins.
+    Journal and sqlite stores are safe to share as they are, as they only write the keys that changed. Values another process changes show up after a restart (snapshot stores: after the next own save).
     """
 
+    _journal_min_compact_bytes = 64 * 1024
+
     _supported_key_types = [
         str,
         int,
@@ -84,11 +729,49 @@ class JsonDictSaver(UserDict):
         data_type: Literal["data", "config", "config/default"] = "data",
         orjson_flags: List[int] = [orjson.OPT_INDENT_2],
         auto_convert_data: bool = True,
+        write_behind: bool = False,
+        flush_interval: float = 5.0,
+        storage: Literal["snapshot", "journal", "sqlite"] = "snapshot",
+        sqlite_cache_size: int = 10_000,
+        journal_max_bytes: int = 4 * 1024 * 1024,
+        journal_compact_ratio: float = 1.0,
+        lazy: bool = False,
+        defaults_from: Optional["JsonDictSaver"] = None,
+        file_format: Literal["json", "compact", "gzip", "zstd"] = "json",
         **kwargs,
     ) -> None:
-        super().__init__(**kwargs)
+        # UserDict.__init__ isn't called, _load() sets the data (and __setitem__ needs everything below).
+        # kwargs are still accepted, they never ended up in the data, as the content of the file always replaced them
+        if file_format == "zstd" and zstandard is None:
+            raise ImportError("file_format='zstd' needs the zstandard package")
+
+        self.file_format = file_format
+        self.filename = f"{data_type}/{name}{_FORMAT_SUFFIXES[file_format]}"
+        self.journal_filename = f"{data_type}/{name}.json.log"
+
+        self.storage = storage
+        self.journal_max_bytes = journal_max_bytes
+        self.journal_compact_ratio = journal_compact_ratio
 
-        self.filename = f"{data_type}/{name}.json"
+        self._journal_keys = set()
+        self._shared_keys = set()  # Keys changed since the last write, only tracked with _SHARED_DATA
+        self._disk_identity: Optional[tuple] = None
+        self._journal_size = 0
+        self._snapshot_size = 0
+        self._compacting = False
+
+        self.write_behind = write_behind
+        self.flush_interval = flush_interval
+        self.last_flush_merged = 0
+
+        self._pending_saves = 0
+        self._flush_timer: Optional[threading.Timer] = None
+        self._state_lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._data_lock = threading.RLock()  # Between changes and _merge_from_disk(), which runs in the flush thread with write_behind
+
+        if write_behind:
+            _write_behind_stores[id(self)] = self
 
         orjson_flags.extend(
             [
@@ -98,21 +781,185 @@ class JsonDictSaver(UserDict):
         self.orjson_option = reduce(
             lambda x, y: x | y, orjson_flags
         )  # Bitwise OR for every flag
+        self._compact_option = self.orjson_option & ~orjson.OPT_INDENT_2
+
+        self._name = name
+        self._data_type = data_type
+        self._default = default
+        self._func_if_default = func_if_default
+        self._defaults_from = defaults_from
+        self._auto_convert_data = auto_convert_data
+        self._sqlite_cache_size = sqlite_cache_size
+        self._unconverted_keys = set()
+        self._assigned: Dict[Any, tuple] = {}  # Key -> (the dict or list put in, its tracked copy), until the next save()
+        self._indexes: Dict[str, StoreIndex] = {}
+
+        snapshot_filename = self._find_snapshot()
+
+        self.change_count = 0
+        self.save_count = 0
+        self.skipped_saves = 0
+        self.write_seconds = 0.0
+        self._saved_change_count = 0
+
+        _stores[self.filename] = self
+
+        self._data = None  # With lazy, loaded on first access, see the data property
+        if not lazy or snapshot_filename is None:
+            self._load(lazy)
+
+    # A property instead of the attribute of UserDict, so lazy stores are loaded on first access
+    @property
+    def data(self) -> Any:
+        if self._data is None:
+            self._load(lazy=True)
+
+        return self._data
+
+    @data.setter
+    def data(self, value: Any):  # pyright: ignore[reportIncompatibleVariableOverride]
+        self._data = value
 
-        if not os.path.exists(self.filename):
-            with open(self.filename, "w+", encoding="utf-8") as f:
-                f.write(orjson.dumps(default, option=self.orjson_option).decode())
+    @property
+    def is_loaded(self) -> bool:
+        return self._data is not None
 
-            if func_if_default:
-                func_if_default()
+    @property
+    def is_dirty(self) -> bool:
+        return self.change_count != self._saved_change_count
 
-        with open(self.filename, "r", encoding="utf-8") as f:
-            data = orjson.loads(f.read())
+    def _mark_changed(self, key: Any, update_indexes: bool = True):
+        with self._data_lock:
+            self.change_count += 1
 
-        if auto_convert_data:
-            self.data = self._convert_data_to_correct_types(data)
+            if self._assigned:
+                self._assigned.pop(key, None)  # Changed through the store, the object put in doesn't matter anymore
+
+            if self.storage == "journal":
+                self._journal_keys.add(key)
+            elif self.storage == "sqlite":
+                self._data.mark_dirty(key)  # type: ignore
+            elif _SHARED_DATA:
+                self._shared_keys.add(key)
+
+            if update_indexes and self._indexes:
+                self._update_indexes(key)
+
+    def _index_new_value(self, key: Any, item: Any):
+        """
+        Updates the indexes for key before it is set to item. If an index can't take the new value, the indexes updated already are reset, so the store and its indexes stay as they were.
+        """
+        updated = []
+        try:
+            for index in self._indexes.values():
+                index.update(key, item)
+                updated.append(index)
+        except Exception:
+            for index in updated:
+                if key in self.data:
+                    index.update(key, self[key])
+                else:
+                    index.update(key)
+            raise
+
+    def _update_indexes(self, key: Any):
+        if key in self.data:
+            value = self[key]
+            for index in self._indexes.values():
+                index.update(key, value)
+        else:
+            for index in self._indexes.values():
+                index.update(key)
+
+    def add_index(
+        self, name: str, path_or_function: Union[str, Sequence[Any], Callable[[Any], Any]]
+    ) -> StoreIndex:
+        """
+        Adds (or replaces) the index name and gives it back, see StoreIndex for how to query it.
+        path_or_function is a path into the values like "settings.language" (or a tuple of keys), or a function that gets a value and gives back what to index it under.
+        """
+        index = StoreIndex(
+            name,
+            path_or_function,
+            _convert_string if self._auto_convert_data else lambda x: x,
+        )
+        index.rebuild((key, self[key]) for key in list(self.data))
+        self._indexes[name] = index
+
+        return index
+
+    def index(self, name: str) -> StoreIndex:
+        return self._indexes[name]
+
+    def preload(self, keys: Sequence[Any]):
+        """
+        With storage="sqlite", loads the values of many keys at once instead of with one query each when they are read. The other storages have every value in memory already.
+        """
+        if self.storage == "sqlite":
+            self.data.preload(keys)  # type: ignore
+
+    def _convert_item(self, key: Any, item: Any) -> Any:
+        """
+        Converts a loaded top-level value and makes it report changes.
+        """
+        return _convert_data(item, _ChangeTracker(self, key), self._auto_convert_data)
+
+    def _load(self, lazy: bool):
+        """
+        Reads the file and converts the data. In lazy mode, values that are dicts or lists are only converted the first time they are read (see __getitem__).
+        """
+        if self.storage == "sqlite":
+            with _file_lock(self.filename):  # Only one process may migrate the JSON file
+                self._data = _SqliteMapping(
+                    f"{self._data_type}/{self._name}.sqlite3",
+                    f"{self._data_type}/{self._name}.json",
+                    self._default,
+                    self._func_if_default,
+                    (
+                        self._convert_single_value_to_correct_type
+                        if self._auto_convert_data
+                        else lambda x: x
+                    ),
+                    self._convert_item,
+                    self._compact_option,
+                    self._sqlite_cache_size,
+                )  # type: ignore
         else:
-            self.data = data
+            with _file_lock(self.filename):
+                if self._find_snapshot() is None:
+                    _atomic_write(self.filename, self._encode(self._default))
+
+                    if self._func_if_default:
+                        self._func_if_default()
+
+                data = self._read_data()
+                self._disk_identity = _file_identity(self.filename)
+
+            self._data = {}
+            for key, val in data.items():
+                if self._auto_convert_data:
+                    key = _convert_string(key)
+
+                if lazy and (type(val) is dict or type(val) is list):
+                    self._unconverted_keys.add(key)
+                else:
+                    val = self._convert_item(key, val)
+
+                self._data[key] = val
+
+        if self._defaults_from is not None:
+            for k, v in self._defaults_from.items():
+                if k not in self._data:
+                    self[k] = v
+
+            if self.is_dirty:
+                with self._write_lock:
+                    self._write()
+
+            self._defaults_from = None
+
+        for index in self._indexes.values():
+            index.rebuild((key, self[key]) for key in list(self.data))
 
     def __enter__(self):
         return self
@@ -127,58 +974,529 @@ class JsonDictSaver(UserDict):
         if not any([isinstance(item, c) for c in self._supported_value_types]):
             raise TypeError(f"Item value '{item}' ({type(item)}) is not supported")
 
-        return super().__setitem__(key, item)
+        tracked = _convert_data(item, _ChangeTracker(self, key), False)
+
+        with self._data_lock:
+            if self._indexes:
+                self._index_new_value(key, tracked)
+
+            self._unconverted_keys.discard(key)
+
+            super().__setitem__(key, tracked)
+            self._mark_changed(key, update_indexes=False)
+
+            if tracked is not item and not isinstance(item, (_TrackedDict, _TrackedList)):
+                self._assigned[key] = (item, tracked)
+
+    def __getitem__(self, key: Any) -> Any:
+        data = self.data
+
+        if key in self._unconverted_keys:
+            with self._data_lock:
+                if key in self._unconverted_keys:  # Not replaced by _merge_from_disk() in the meantime
+                    data[key] = self._convert_item(key, data[key])
+                    self._unconverted_keys.discard(key)
+
+        return super().__getitem__(key)
+
+    def __delitem__(self, key: Any) -> None:
+        with self._data_lock:
+            super().__delitem__(key)
+            self._unconverted_keys.discard(key)
+            self._mark_changed(key)
+
+    def __ior__(self, other: Any):
+        self.update(other)
+        return self
+
+    def _take_over_assigned(self):
+        """
+        Dicts and lists that were changed through the object put into the store (instead of through the store) since they were put in are put in again, so the change isn't lost.
+        """
+        assigned, self._assigned = self._assigned, {}
+
+        for key, (original, tracked) in assigned.items():
+            if original != tracked:
+                logger.warning(
+                    f"{self.filename}: The value of {key!r} was changed through the object put into the store, change it through the store (store[key][...] = ...) instead. Changes like that are only seen until the next save()"
+                )
+                self[key] = original
+                self._assigned.pop(key, None)
 
     def save(self):
-        with open(self.filename, "w", encoding="utf-8") as f:
-            f.write(orjson.dumps(self.data, option=self.orjson_option).decode())
+        if self._assigned:
+            self._take_over_assigned()
+
+        if not self.is_loaded or not self.is_dirty:
+            self.skipped_saves += 1
+            return
+
+        if not self.write_behind:
+            with self._write_lock:
+                self._write()
+            return
+
+        with self._state_lock:
+            self._pending_saves += 1
+
+            if self._flush_timer is None:
+                self._flush_timer = threading.Timer(self.flush_interval, self.flush)
+                self._flush_timer.daemon = True
+                self._flush_timer.start()
+
+    def flush(self):
+        """
+        Writes all saves that are still pending from write-behind mode. Does nothing if there are none.
+        """
+        with self._write_lock:
+            with self._state_lock:
+                if self._flush_timer is not None:
+                    self._flush_timer.cancel()
+                    self._flush_timer = None
+
+                merged = self._pending_saves
+                self._pending_saves = 0
+
+            if merged == 0:
+                return
+
+            self._write()
+            self.last_flush_merged = merged
+
+        logger.debug(f"Flushed {self.filename}, merged {merged} save(s) into one write")
+
+    async def aflush(self):
+        await asyncio.to_thread(self.flush)
+
+    def remove_files(self):
+        """
+        Deletes every file of the store (the snapshot in any file_format, the journal and the sqlite file). Pending write-behind saves are dropped, don't use the store afterwards.
+        """
+        with self._state_lock:
+            if self._flush_timer is not None:
+                self._flush_timer.cancel()
+                self._flush_timer = None
+
+            self._pending_saves = 0
+
+        with self._write_lock:
+            if self.storage == "sqlite" and self._data is not None:
+                self._data.close()  # type: ignore
+
+            base = f"{self._data_type}/{self._name}"
+            filenames = [f"{base}{suffix}" for suffix in set(_FORMAT_SUFFIXES.values())]
+            filenames += [
+                self.journal_filename,
+                f"{self.journal_filename}.old",
+                f"{base}.sqlite3",
+                f"{base}.sqlite3-wal",
+                f"{base}.sqlite3-shm",
+            ]
+
+            for filename in filenames:
+                with contextlib.suppress(FileNotFoundError):
+                    os.remove(filename)
+
+    def _write(self):
+        change_count = self.change_count
+        start = time.perf_counter()
+
+        if self.storage == "sqlite":
+            self.data.commit()  # type: ignore
+        elif self.storage == "journal":
+            self._append_journal()
+        else:
+            with _file_lock(self.filename):
+                if _SHARED_DATA:
+                    with self._data_lock:
+                        keys, self._shared_keys = self._shared_keys, set()
+                    self._merge_from_disk(keys)
+
+                _atomic_write(self.filename, self._encode(self.data))
+                self._disk_identity = _file_identity(self.filename)
+
+        self._saved_change_count = change_count
+        self.save_count += 1
+        self.write_seconds += time.perf_counter() - start
+
+    def _merge_from_disk(self, own_keys: set):
+        """
+        Takes over the top-level keys that other processes wrote to the snapshot since this process read or wrote it. Keys in own_keys were changed here and are kept as they are.
+        The file is read and converted without the _data_lock, only taking over the values holds it, so changes made meanwhile (keys that are in _shared_keys again) are kept as well.
+        """
+        if _file_identity(self.filename) == self._disk_identity:
+            return
+
+        with open(self.filename, "rb") as f:
+            disk_data = _decode(f.read())
+
+        disk_values = {}
+        for key, val in disk_data.items():
+            if self._auto_convert_data:
+                key = _convert_string(key)
+
+            if key not in own_keys:
+                disk_values[key] = self._convert_item(key, val)
+
+        with self._data_lock:
+            data = self.data
+            keep = own_keys | self._shared_keys
+
+            for key, val in disk_values.items():
+                if key in keep:
+                    continue
+
+                data[key] = val
+                self._unconverted_keys.discard(key)
+
+                for index in self._indexes.values():
+                    index.update(key, val)
+
+            for key in [k for k in data if k not in disk_values and k not in keep]:
+                del data[key]  # Deleted by another process
+                self._unconverted_keys.discard(key)
+
+                for index in self._indexes.values():
+                    index.update(key)
+
+    def _encode(self, data: Any) -> bytes:
+        if self.file_format == "json":
+            return orjson.dumps(data, option=self.orjson_option)
+
+        content = orjson.dumps(data, option=self._compact_option)
+
+        if self.file_format == "gzip":
+            return gzip.compress(content, compresslevel=6)
+
+        if self.file_format == "zstd":
+            return zstandard.ZstdCompressor().compress(content)  # type: ignore
+
+        return content
+
+    def _find_snapshot(self) -> Optional[str]:
+        """
+        Gives back the snapshot file that exists, preferring the one of the current file_format.
+        """
+        base = f"{self._data_type}/{self._name}"
+
+        for filename in [self.filename] + [
+            f"{base}{suffix}" for suffix in _FORMAT_SUFFIXES.values()
+        ]:
+            if os.path.exists(filename):
+                return filename
+
+        return None
+
+    def _read_data(self) -> dict:
+        snapshot_filename = self._find_snapshot()
+        assert snapshot_filename is not None
+
+        with open(snapshot_filename, "rb") as f:
+            data = _decode(f.read())
+
+        if snapshot_filename != self.filename:  # Written in another file_format before
+            _atomic_write(self.filename, self._encode(data))
+            os.remove(snapshot_filename)
+
+            logger.info(f"Converted {snapshot_filename} to {self.filename}")
+
+        self._snapshot_size = os.path.getsize(self.filename)
+
+        if self.storage != "journal":
+            return data
+
+        old_journal_filename = f"{self.journal_filename}.old"
+        recovered = os.path.exists(old_journal_filename)
+
+        if recovered:  # A compaction was interrupted, the old log is not in the snapshot for sure
+            self._replay_journal(data, old_journal_filename)
+
+        self._journal_size = self._replay_journal(data, self.journal_filename)
+
+        if recovered:
+            _atomic_write(self.filename, self._encode(data))
+            os.remove(old_journal_filename)
+            if os.path.exists(self.journal_filename):
+                os.remove(self.journal_filename)
+
+            self._snapshot_size = os.path.getsize(self.filename)
+            self._journal_size = 0
+
+        return data
+
+    @staticmethod
+    def _replay_journal(data: dict, filename: str) -> int:
+        """
+        Applies all records of a journal file to the raw data and returns the size of the file.
+        """
+        if not os.path.exists(filename):
+            return 0
+
+        with open(filename, "rb") as f:
+            content = f.read()
+
+        for line in content.splitlines():
+            try:
+                record = orjson.loads(line)
+            except orjson.JSONDecodeError:
+                continue  # Only the last record can be incomplete, from a crash mid-append
+
+            if "s" in record:
+                data.update(record["s"])
+            else:
+                for key in record["d"]:
+                    data.pop(key, None)
+
+        return len(content)
+
+    def _append_journal(self):
+        keys, self._journal_keys = self._journal_keys, set()
+        if not keys:
+            return
+
+        records = []
+        for key in keys:
+            if key in self.data:
+                record = {"s": {key: self.data[key]}}
+            else:
+                record = {"d": {key: None}}
+
+            records.append(orjson.dumps(record, option=self._compact_option))
+
+        content = b"\n".join(records) + b"\n"
+
+        with _file_lock(self.filename):
+            with open(self.journal_filename, "ab") as f:
+                f.write(content)
+                f.flush()
+                os.fsync(f.fileno())
+
+            if _SHARED_DATA:  # Other processes append to the same log
+                self._journal_size = os.path.getsize(self.journal_filename)
+            else:
+                self._journal_size += len(content)
+
+        if not self._compacting and (
+            self._journal_size >= self.journal_max_bytes
+            or (
+                self._journal_size >= self._journal_min_compact_bytes
+                and self._journal_size
+                > self._snapshot_size * self.journal_compact_ratio
+            )
+        ):
+            self._compacting = True
+            threading.Thread(target=self._compact_journal, daemon=True).start()
+
+    def _compact_journal(self):
+        """
+        Writes a fresh snapshot and drops the log. Only the serialization and the log rotation block saves, the slow write does not.
+        """
+        old_journal_filename = f"{self.journal_filename}.old"
+
+        if _SHARED_DATA:
+            try:
+                self._compact_shared_journal()
+            finally:
+                self._compacting = False
+            return
+
+        try:
+            with self._write_lock:
+                content = self._encode(self.data)
+                os.replace(self.journal_filename, old_journal_filename)
+                self._journal_size = 0
+
+            _atomic_write(self.filename, content)
+            os.remove(old_journal_filename)
+            self._snapshot_size = len(content)
+
+            logger.debug(f"Compacted journal of {self.filename}")
+        finally:
+            self._compacting = False
+
+    def _compact_shared_journal(self):
+        """
+        Compaction for a log other processes write to as well. The memory of this process doesn't have their records, so the snapshot is built from the files instead, with all processes waiting.
+        """
+        with self._write_lock, _file_lock(self.filename):
+            if not os.path.exists(self.journal_filename):
+                self._journal_size = 0
+                return  # Another process compacted it already
+
+            with open(self.filename, "rb") as f:
+                data = _decode(f.read())
+
+            self._replay_journal(data, self.journal_filename)
+
+            content = self._encode(data)
+            _atomic_write(self.filename, content)
+            os.remove(self.journal_filename)  # A crash before this only replays records the snapshot has already
+            self._snapshot_size = len(content)
+            self._journal_size = 0
+
+        logger.debug(f"Compacted shared journal of {self.filename}")
 
     def _convert_single_value_to_correct_type(self, val):
         if isinstance(val, str):
-            if val.isnumeric():
-                val = int(val)
+            return _convert_string(val)
+
+        return val
 
-            elif val.replace(".", "").isnumeric() and val.count(".") == 1:
-                val = float(val)
 
-            elif val == "true":
-                val = True
+class ShardedJsonDictSaver(MutableMapping):
+    """
+    Splits a store into multiple JsonDictSavers in "data/<name>/". By default every key gets its own file (meant for guild IDs), with buckets set, keys are spread over that many files by hash.
+    Shards are loaded on demand and at most max_loaded_shards of them are kept in memory. The least recently used one is dropped when another one is needed, and saved first if it was changed.
+    All other keyword arguments are passed to every shard JsonDictSaver.
 
-            elif val == "false":
-                val = False
+    Note: Iterating (and len()) has to look at every shard, in bucket mode this loads all of them one by one.
+    """
 
-            elif val == "null":
-                val = None
+    _shard_name_pattern = re.compile(r"[\w.-]+")
 
-            elif re.match(r"\d{1,4}-\d{1,2}-\d{1,2}T\d{1,2}:\d{1,2}:\d{1,2}", val):
-                val = datetime.datetime.fromisoformat(val)
+    def __init__(
+        self,
+        name: str,
+        buckets: Optional[int] = None,
+        max_loaded_shards: int = 128,
+        **saver_kwargs,
+    ) -> None:
+        self.name = name
+        self.directory = f"data/{name}"
+        self.buckets = buckets
+        self.max_loaded_shards = max_loaded_shards
 
-            elif re.match(r"\d{1,4}-\d{1,2}-\d{1,2}", val):
-                val = datetime.date.fromisoformat(val)
+        self._saver_kwargs = saver_kwargs
+        if saver_kwargs.get("storage") == "sqlite":
+            self._suffix = ".sqlite3"
+        else:  # Snapshot and journal stores always have a snapshot file
+            self._suffix = _FORMAT_SUFFIXES[saver_kwargs.get("file_format", "json")]
+        self._shards: "OrderedDict[str, JsonDictSaver]" = OrderedDict()
 
-            elif re.match(r"\d{1,2}:\d{1,2}:\d{1,2}", val):
-                val = datetime.time.fromisoformat(val)
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
 
-            elif re.match(
-                r"[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}",
-                val,
-            ):
-                val = uuid.UUID(f"{{{val}}}")
+    def __enter__(self):
+        return self
 
-        return val
+    def __exit__(self, type, value, traceback):
+        self.save()
 
-    def _convert_data_to_correct_types(self, data: dict):
-        new_data = {}
+    def _shard_name(self, key: Any) -> str:
+        raw_key = _raw_key(key)
 
-        for key, sub_data in data.items():
-            if isinstance(sub_data, dict):
-                sub_data = self._convert_data_to_correct_types(sub_data)
-            else:
-                sub_data = self._convert_single_value_to_correct_type(sub_data)
+        if self.buckets is not None:
+            return f"bucket_{zlib.crc32(raw_key.encode()) % self.buckets}"
+
+        if not self._shard_name_pattern.fullmatch(raw_key):
+            raise ValueError(
+                f"Key '{key}' can't be used as a file name, use buckets for keys like this"
+            )
+
+        return raw_key
+
+    def _shard(self, shard_name: str, create: bool) -> Optional[JsonDictSaver]:
+        if shard_name in self._shards:
+            self._shards.move_to_end(shard_name)
+            return self._shards[shard_name]
+
+        if not create and not os.path.exists(
+            f"{self.directory}/{shard_name}{self._suffix}"
+        ):
+            return None
+
+        shard = JsonDictSaver(f"{self.name}/{shard_name}", **self._saver_kwargs)
+        self._shards[shard_name] = shard
+
+        while len(self._shards) > self.max_loaded_shards:
+            self._evict(next(iter(self._shards)))
+
+        return shard
+
+    def _evict(self, shard_name: str):
+        shard = self._shards.pop(shard_name)
+
+        if shard.is_dirty:
+            shard.save()
+            shard.flush()  # A reload must not read the file before a write-behind flush
+
+    def _shard_names(self) -> List[str]:
+        names = {
+            entry.name[: -len(self._suffix)]
+            for entry in os.scandir(self.directory)
+            if entry.is_file() and entry.name.endswith(self._suffix)
+        }
+        names.update(self._shards)
+
+        return sorted(names)
 
-            new_data[self._convert_single_value_to_correct_type(key)] = sub_data
+    def __getitem__(self, key: Any) -> Any:
+        shard_name = self._shard_name(key)
+        shard = self._shard(shard_name, create=False)
 
-        return new_data
+        if shard is None:
+            raise KeyError(key)
+
+        return shard[key]
+
+    def __setitem__(self, key: Any, item: Any) -> None:
+        self._shard(self._shard_name(key), create=True)[key] = item  # type: ignore
+
+    def __delitem__(self, key: Any) -> None:
+        shard_name = self._shard_name(key)
+        shard = self._shard(shard_name, create=False)
+
+        if shard is None:
+            raise KeyError(key)
+
+        del shard[key]
+
+        if self.buckets is None:
+            self._shards.pop(shard_name)
+            shard.remove_files()
+
+    def __contains__(self, key: Any) -> bool:
+        shard = self._shard(self._shard_name(key), create=False)
+        return shard is not None and key in shard
+
+    def __iter__(self):
+        for shard_name in self._shard_names():
+            if self.buckets is None and shard_name not in self._shards:
+                yield (
+                    _convert_string(shard_name)
+                    if self._saver_kwargs.get("auto_convert_data", True)
+                    else shard_name
+                )
+                continue
+
+            shard = self._shard(shard_name, create=False)
+            if shard is not None:
+                yield from list(shard)
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+    @property
+    def loaded_shards(self) -> int:
+        return len(self._shards)
+
+    @property
+    def is_dirty(self) -> bool:
+        return any(shard.is_dirty for shard in self._shards.values())
+
+    def save(self):
+        """
+        Saves all loaded shards that were changed since their last save.
+        """
+        for shard in list(self._shards.values()):
+            shard.save()
+
+    def flush(self):
+        for shard in list(self._shards.values()):
+            shard.flush()
+
+    async def aflush(self):
+        await asyncio.gather(*[shard.aflush() for shard in list(self._shards.values())])
 
 
 categories = {}
@@ -186,17 +1504,14 @@ for entry in os.scandir("config/default/"):
     if entry.is_file():
         category_name = entry.name.replace(".json", "")
 
-        default = JsonDictSaver(category_name, data_type="config/default")
-        conf = JsonDictSaver(category_name, data_type="config")
-
-        for k, v in default.items():
-            if k not in conf:
-                conf[k] = v
-
-        conf.save()
-        categories[category_name] = conf
-
-        del default
+        categories[category_name] = JsonDictSaver(
+            category_name,
+            data_type="config",
+            lazy=True,
+            defaults_from=JsonDictSaver(
+                category_name, data_type="config/default", lazy=True
+            ),
+        )
 
 CONFIG = Config(categories)
 
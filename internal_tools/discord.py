@@ -21,7 +21,7 @@ def fancy_embed(
     description: str = "",
     fields: dict = {},
     inline: bool = False,
-    color: interactions.Color = CONFIG_EMBED_COLOR(),
+    color: Optional[interactions.Color] = None,
     footer: Optional[str] = "Made by: @ToasterUwU",
     url: Optional[str] = None,
     timestamp: Optional[interactions.Timestamp] = None,
@@ -32,6 +32,9 @@ def fancy_embed(
     """
     Embed generator to save some repeating code
     """
+    if color is None:
+        color = CONFIG_EMBED_COLOR()
+
     embed = interactions.Embed(
         title=title, description=description, color=color, url=url, timestamp=timestamp
     )
@@ -0,0 +1,234 @@
+import asyncio
+import datetime
+import hashlib
+import logging
+import traceback
+from collections import OrderedDict, deque
+from typing import Deque, Optional, Tuple, Union
+
+import interactions
+
+from internal_tools.configuration import CONFIG
+
+__all__ = ["ERROR_REPORTER", "ErrorReporter"]
+__reloadable__ = False
+
+logger = logging.getLogger("DiscordBot")
+
+MESSAGE_LIMIT = 2000
+
+
+def fingerprint(txt_or_error: Union[str, Exception]) -> str:
+    """
+    Same place and type of error -> same fingerprint. The message is left out, it often contains IDs or other things that change every time.
+    """
+    if isinstance(txt_or_error, str):
+        return hashlib.sha1(txt_or_error.encode()).hexdigest()
+
+    parts = []
+    error: Optional[BaseException] = txt_or_error
+    seen = set()
+    while error is not None and id(error) not in seen:
+        seen.add(id(error))
+        parts.append(f"{type(error).__module__}.{type(error).__qualname__}")
+        parts += [
+            f"{frame.filename}:{frame.lineno}:{frame.name}"
+            for frame in traceback.extract_tb(error.__traceback__)
+        ]
+        error = error.__cause__ or error.__context__
+
+    return hashlib.sha1("\n".join(parts).encode()).hexdigest()
+
+
+class _PendingError:
+    __slots__ = ("text", "is_traceback", "count", "first_seen")
+
+    def __init__(self, text: str, is_traceback: bool) -> None:
+        self.text = text
+        self.is_traceback = is_traceback
+        self.count = 1
+        self.first_seen = datetime.datetime.now()
+
+    def render(self, limit: int) -> str:
+        repeated = ""
+        if self.count > 1:
+            repeated = f" ({self.count}x since {self.first_seen:%H:%M:%S})"
+
+        if not self.is_traceback:
+            return (self.text[: limit - len(repeated)]) + repeated
+
+        header = f"Unpredicted Error{repeated}:\n"
+        keep = limit - len(header) - len("```\n...\n```")
+        if len(self.text) > keep:
+            # The end of a traceback is the interesting part
+            return f"{header}```\n...{self.text[-keep:]}\n```"
+
+        return f"{header}```\n{self.text}\n```"
+
+
+class ErrorReporter:
+    """
+    Sends errors to the ERROR_WEBHOOK_URL from a background task instead of right away.
+
+    Errors with the same fingerprint (type and place) within one window are counted and sent once, several errors are put into one message as long as it stays below Discords size limit.
+    At most max_pending different errors wait for the next window, further new ones are only counted, so an outage can't fill the memory.
+    When Discord answers with 429 (rate limited), sending waits longer each time until it goes through again.
+    """
+
+    def __init__(
+        self,
+        window: float = 10.0,
+        max_pending: int = 50,
+        max_backoff: float = 300.0,
+    ) -> None:
+        self.window = window
+        self.max_pending = max_pending
+        self.max_backoff = max_backoff
+
+        self.pending: "OrderedDict[str, _PendingError]" = OrderedDict()
+        self.unsent: Deque[str] = deque(maxlen=max_pending)
+        self.dropped = 0
+        self.sent_messages = 0
+
+        self._client: Optional[interactions.Client] = None
+        self._webhook: Optional[Tuple[str, interactions.Webhook]] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._backoff = 0.0
+
+    def install(self, bot: interactions.Client, timeout: float = 10.0):
+        """
+        Sends what still waits when the Bot stops, before its HTTP session is closed. Gives up after timeout seconds, so a Discord outage doesn't block the shutdown.
+        """
+        previous_stop = bot.stop
+
+        async def stop():
+            if self._task is not None:
+                self._task.cancel()  # Sending twice at the same time could send a message twice
+
+            try:
+                await asyncio.wait_for(self.aflush(), timeout)
+            except asyncio.TimeoutError:
+                logger.warning(f"Could not send {len(self.unsent)} error message(s) before stopping")
+
+            await previous_stop()
+
+        bot.stop = stop  # type: ignore
+
+    def report(self, txt_or_error: Union[str, Exception], client: interactions.Client):
+        """
+        Queues an error to be sent, returns right away.
+        """
+        if not CONFIG["GENERAL"]["ERROR_WEBHOOK_URL"]:
+            return
+
+        self._client = client
+
+        key = fingerprint(txt_or_error)
+        entry = self.pending.get(key)
+        if entry is not None:
+            entry.count += 1
+        elif len(self.pending) >= self.max_pending:
+            self.dropped += 1
+        else:
+            if isinstance(txt_or_error, Exception):
+                text = "".join(
+                    traceback.format_exception(
+                        type(txt_or_error), txt_or_error, txt_or_error.__traceback__
+                    )
+                )
+                self.pending[key] = _PendingError(text, is_traceback=True)
+            else:
+                self.pending[key] = _PendingError(txt_or_error, is_traceback=False)
+
+        self._ensure_running()
+
+    def _ensure_running(self):
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+        elif self._wakeup is not None:
+            self._wakeup.set()
+
+    async def _run(self):
+        assert self._wakeup is not None
+
+        while True:
+            await asyncio.sleep(self.window + self._backoff)
+
+            self._collect()
+            if not self.unsent:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.window * 6)
+                except asyncio.TimeoutError:
+                    return  # Idle, started again by the next report
+                continue
+
+            await self._send_unsent()
+
+    def _collect(self):
+        """
+        Turns the errors of the last window into as few messages as possible.
+        """
+        entries = list(self.pending.values())
+        self.pending.clear()
+
+        texts = [x.render(MESSAGE_LIMIT) for x in entries]
+        if self.dropped:
+            texts.append(
+                f"{self.dropped} more errors were not sent, too many different ones at the same time."
+            )
+            self.dropped = 0
+
+        message = ""
+        for text in texts:
+            if message and len(message) + 1 + len(text) > MESSAGE_LIMIT:
+                self.unsent.append(message)
+                message = ""
+            message = f"{message}\n{text}" if message else text
+
+        if message:
+            self.unsent.append(message)
+
+    async def _send_unsent(self):
+        while self.unsent:
+            try:
+                await self.webhook().send(self.unsent[0])
+            except interactions.errors.HTTPException as e:
+                if e.status == 429:
+                    self._backoff = min(
+                        max(self._backoff * 2, self.window), self.max_backoff
+                    )
+                    return
+                logger.warning(f"Could not send error to webhook: {e}")
+            except Exception as e:
+                logger.warning(f"Could not send error to webhook: {e}")
+            else:
+                self.sent_messages += 1
+                self._backoff = 0.0
+
+            self.unsent.popleft()
+
+    def webhook(self) -> interactions.Webhook:
+        """
+        One Webhook object for as long as the URL stays the same.
+        """
+        url = CONFIG["GENERAL"]["ERROR_WEBHOOK_URL"]
+        if self._webhook is None or self._webhook[0] != url:
+            self._webhook = (
+                url,
+                interactions.Webhook.from_url(url, client=self._client),  # type: ignore
+            )
+
+        return self._webhook[1]
+
+    async def aflush(self):
+        """
+        Sends everything that waits right now, for shutting down.
+        """
+        self._collect()
+        await self._send_unsent()
+
+
+ERROR_REPORTER = ErrorReporter()
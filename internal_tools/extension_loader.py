@@ -0,0 +1,646 @@
+import ast
+import asyncio
+import bisect
+import hashlib
+import importlib
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+import interactions
+
+from internal_tools.configuration import JsonDictSaver
+from internal_tools.general import get_process_memory
+from internal_tools.startup import STARTUP_PROFILER
+
+__all__ = ["EXTENSION_CATALOG", "EXTENSION_LOADER", "discover_extensions"]
+__reloadable__ = False
+
+logger = logging.getLogger("DiscordBot")
+
+
+def discover_extensions() -> List[str]:
+    """
+    Module names of all extensions that should be loaded. (Extensions that start with _ are disabled)
+    """
+    return [
+        "extensions." + x.name.replace(".py", "")
+        for x in os.scandir("extensions")
+        if not x.name.startswith("_")
+    ]
+
+
+def _extension_path(extension: str) -> str:
+    path = extension.replace(".", "/")
+    if os.path.isdir(path):
+        return f"{path}/__init__.py"
+
+    return f"{path}.py"
+
+
+def _timed_import(extension: str) -> Tuple[float, Optional[Exception]]:
+    start = time.perf_counter()
+    try:
+        importlib.import_module(extension)
+    except Exception as e:  # Reported by load_extension, which imports it again
+        return time.perf_counter() - start, e
+
+    return time.perf_counter() - start, None
+
+
+class ExtensionMetrics:
+    def __init__(self, lazy: bool) -> None:
+        self.lazy = lazy
+        self.loaded = False
+        self.import_seconds: Optional[float] = None
+        self.setup_seconds: Optional[float] = None
+        self.memory_delta: Optional[int] = None
+
+
+class ExtensionLoader:
+    """
+    Loads extensions in dependency order and keeps lazy extensions off the startup path.
+
+    Extensions can declare (as plain literals at module level, they are read without importing the module):
+    - DEPENDENCIES = ["extensions.other"]: Loaded before this one, also when this one is loaded lazily.
+    - LAZY = True: Only stubs of its slash commands and listeners are registered, the module is imported the first time one of them is used.
+
+    Stubs are built from a manifest written the last time the extension was really loaded (data/lazy_extensions.json), so the first start after a change of the file loads it normally.
+    Extensions with other kinds of commands (context menus, components, modals) are always loaded normally.
+    """
+
+    def __init__(self) -> None:
+        self.bot: Optional[interactions.Client] = None
+        self.metrics: Dict[str, ExtensionMetrics] = {}
+
+        self._manifest: Optional[JsonDictSaver] = None
+        self._dependencies: Dict[str, List[str]] = {}
+        self._lazy = set()
+        self._stubs: Dict[str, Tuple[list, list]] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+
+    @property
+    def manifest(self) -> JsonDictSaver:
+        if self._manifest is None:
+            # Without converting, option choices like "10" or "true" stay strings
+            self._manifest = JsonDictSaver(
+                "lazy_extensions", lazy=True, auto_convert_data=False
+            )
+
+        return self._manifest
+
+    def read_metadata(self, extension: str) -> Tuple[List[str], bool]:
+        """
+        Gives back DEPENDENCIES and LAZY of an extension without importing it.
+        """
+        with open(_extension_path(extension), "rb") as f:
+            tree = ast.parse(f.read())
+
+        dependencies = []
+        lazy = False
+
+        for node in tree.body:
+            if (
+                isinstance(node, ast.Assign)
+                and len(node.targets) == 1
+                and isinstance(node.targets[0], ast.Name)
+            ):
+                if node.targets[0].id == "DEPENDENCIES":
+                    dependencies = [
+                        x if x.startswith("extensions.") else f"extensions.{x}"
+                        for x in ast.literal_eval(node.value)
+                    ]
+                elif node.targets[0].id == "LAZY":
+                    lazy = bool(ast.literal_eval(node.value))
+
+        return dependencies, lazy
+
+    def order(self, extensions: List[str]) -> List[str]:
+        """
+        Sorts extensions so that every one comes after its dependencies. Extensions with missing or circular dependencies are left out (and reported).
+        """
+        ordered = []
+        state: Dict[str, str] = {}
+
+        def visit(extension: str, path: List[str]) -> bool:
+            if state.get(extension) == "done":
+                return True
+            if state.get(extension) in ("visiting", "failed"):
+                if state.get(extension) == "visiting":
+                    logger.error(f"Circular dependency: {' -> '.join(path + [extension])}")
+                return False
+            if extension not in self._dependencies:
+                logger.error(f"Missing dependency: {' -> '.join(path + [extension])}")
+                return False
+
+            state[extension] = "visiting"
+            for dependency in self._dependencies[extension]:
+                if not visit(dependency, path + [extension]):
+                    state[extension] = "failed"
+                    return False
+
+            state[extension] = "done"
+            ordered.append(extension)
+            return True
+
+        for extension in extensions:
+            visit(extension, [])
+
+        return ordered
+
+    def is_loaded(self, extension: str) -> bool:
+        return self.bot is not None and bool(self.bot.get_extensions(extension))
+
+    def is_stub(self, extension: str) -> bool:
+        return extension in self._stubs
+
+    def load_all(
+        self,
+        bot: interactions.Client,
+        extensions: List[str],
+        parallel_imports: bool = False,
+    ):
+        """
+        Loads all given extensions in dependency order, lazy ones only as stubs when possible.
+        With parallel_imports, all modules that are loaded right away are imported at the same time in a thread pool first.
+        Parallel imports only pay off when imports wait on I/O (slow disks, network drives, native libraries). Compiling holds the GIL, so for small extensions on a local disk it is slower.
+        """
+        self.bot = bot
+
+        for extension in extensions:
+            try:
+                dependencies, lazy = self.read_metadata(extension)
+            except Exception as e:
+                logger.error(f"Could not read {extension}: {e}")
+                continue
+
+            self._dependencies[extension] = dependencies
+            if lazy:
+                self._lazy.add(extension)
+
+        ordered = self.order(extensions)
+        needed = {d for x in ordered for d in self._dependencies[x]}
+        stubbed = [
+            x
+            for x in ordered
+            if x in self._lazy and x not in needed and self._can_stub(x)
+        ]
+        eager = [x for x in ordered if x not in stubbed]
+
+        imports_seconds = 0.0
+        if parallel_imports:
+            start = time.perf_counter()
+            with ThreadPoolExecutor() as pool:
+                results = list(pool.map(_timed_import, eager))
+            imports_seconds = time.perf_counter() - start
+
+            for extension, (seconds, _) in zip(eager, results):
+                STARTUP_PROFILER.record(f"import {extension}", seconds)
+                self.metrics[extension] = ExtensionMetrics(extension in self._lazy)
+                self.metrics[extension].import_seconds = seconds
+
+        for extension in eager:
+            try:
+                self.load(extension)
+                logger.info(f"Loaded: {extension}")
+            except Exception as e:
+                logger.exception(f"Could not load {extension}: {e}")
+
+        if not parallel_imports:
+            imports_seconds = sum(
+                self.metrics[x].import_seconds or 0 for x in eager if x in self.metrics
+            )
+
+        STARTUP_PROFILER.record_extension_imports(imports_seconds, parallel_imports)
+
+        for extension in stubbed:
+            self._register_stubs(extension)
+            logger.info(f"Registered lazy: {extension}")
+
+    def load(self, extension: str, memory_before: Optional[int] = None):
+        """
+        Loads an extension (replacing its stubs, if it has some) and records how long that took and how much memory it needed.
+        memory_before is for when the module was already imported somewhere else, so the import is counted as well.
+        """
+        assert self.bot is not None
+
+        for dependency in self._dependencies.get(extension, []):
+            if not self.is_loaded(dependency):
+                self.load(dependency)
+
+        metrics = self.metrics.get(extension)
+        if metrics is None or metrics.loaded:
+            metrics = ExtensionMetrics(extension in self._lazy)
+            self.metrics[extension] = metrics
+
+        self._remove_stubs(extension)
+
+        if memory_before is None:
+            memory_before = get_process_memory()
+
+        if metrics.import_seconds is None:
+            with STARTUP_PROFILER.phase(f"import {extension}"):
+                metrics.import_seconds, _ = _timed_import(extension)
+
+        start = time.perf_counter()
+        with STARTUP_PROFILER.phase(f"setup {extension}"):
+            self.bot.load_extension(extension)
+        metrics.setup_seconds = time.perf_counter() - start
+
+        memory_after = get_process_memory()
+        if memory_before is not None and memory_after is not None:
+            metrics.memory_delta = memory_after - memory_before
+
+        metrics.loaded = True
+        self._update_manifest(extension)
+
+    def unload(self, extension: str):
+        assert self.bot is not None
+
+        if extension in self._stubs:
+            self._remove_stubs(extension)
+        else:
+            self.bot.unload_extension(extension)
+
+        if extension in self.metrics:
+            self.metrics[extension].loaded = False
+
+    def reload(self, extension: str):
+        """
+        Reloads an extension and everything that depends on it. Lazy extensions that were never used stay stubs.
+        """
+        dependents = self.dependents(extension)
+
+        for x in reversed(dependents):
+            if self.is_loaded(x):
+                self.unload(x)
+
+        for x in dependents:
+            if x not in self._stubs:
+                self.metrics.pop(x, None)
+                self.load(x)
+
+    def dependents(self, extension: str) -> List[str]:
+        """
+        The extension itself and all extensions that (indirectly) depend on it, in load order.
+        """
+        affected = {extension}
+        changed = True
+        while changed:
+            changed = False
+            for x, dependencies in self._dependencies.items():
+                if x not in affected and affected.intersection(dependencies):
+                    affected.add(x)
+                    changed = True
+
+        return self.order([x for x in self._dependencies if x in affected])
+
+    def reload_all(self, extensions: List[str]):
+        for extension in extensions:
+            if extension not in self._dependencies:
+                try:
+                    self._dependencies[extension] = self.read_metadata(extension)[0]
+                except Exception:
+                    self._dependencies[extension] = []
+
+        ordered = self.order(extensions)
+
+        for extension in reversed(ordered):
+            if self.is_loaded(extension):
+                self.unload(extension)
+
+        for extension in ordered:
+            if extension not in self._stubs:
+                self.metrics.pop(extension, None)
+                self.load(extension)
+
+    def reload_changed(self, extensions: List[str]) -> List[str]:
+        """
+        Reloads extensions whose files changed and everything that depends on them, re-reading their DEPENDENCIES and LAZY. New files are loaded, deleted ones unloaded.
+        Gives back the extensions that were loaded again.
+        """
+        affected = set()
+
+        for extension in extensions:
+            if not os.path.exists(_extension_path(extension)):
+                if extension in self._dependencies:
+                    for x in reversed(self.dependents(extension)):
+                        if self.is_loaded(x) or x in self._stubs:
+                            self.unload(x)
+                    del self._dependencies[extension]
+                    self.metrics.pop(extension, None)
+                continue
+
+            try:
+                dependencies, lazy = self.read_metadata(extension)
+            except Exception as e:
+                logger.error(f"Could not read {extension}: {e}")
+                continue
+
+            self._dependencies[extension] = dependencies
+            if lazy:
+                self._lazy.add(extension)
+            else:
+                self._lazy.discard(extension)
+
+            affected.update(self.dependents(extension))
+
+        ordered = self.order(sorted(affected))
+
+        for extension in reversed(ordered):
+            if self.is_loaded(extension) or extension in self._stubs:
+                self.unload(extension)
+
+        loaded = []
+        for extension in ordered:
+            self.metrics.pop(extension, None)
+            try:
+                self.load(extension)
+            except Exception as e:
+                logger.exception(f"Could not load {extension}: {e}")
+            else:
+                loaded.append(extension)
+
+        return loaded
+
+    def _source_hash(self, extension: str) -> str:
+        with open(_extension_path(extension), "rb") as f:
+            return hashlib.sha1(f.read()).hexdigest()
+
+    def _can_stub(self, extension: str) -> bool:
+        entry = self.manifest.get(extension)
+
+        return (
+            entry is not None
+            and entry["stubbable"]
+            and entry["hash"] == self._source_hash(extension)
+        )
+
+    def _update_manifest(self, extension: str):
+        """
+        Remembers what commands and listeners a lazy extension has, to build stubs from on the next start.
+        """
+        assert self.bot is not None
+
+        if extension not in self._lazy:
+            return
+
+        commands = []
+        listeners = []
+        stubbable = True
+
+        for ext in self.bot.get_extensions(extension):
+            for command in ext.commands:
+                if not isinstance(command, interactions.SlashCommand):
+                    stubbable = False
+                    continue
+
+                commands.append(
+                    {
+                        "name": str(command.name),
+                        "description": str(command.description),
+                        "group_name": (
+                            str(command.group_name) if command.group_name else None
+                        ),
+                        "group_description": (
+                            str(command.group_description)
+                            if command.group_description
+                            else None
+                        ),
+                        "sub_cmd_name": (
+                            str(command.sub_cmd_name) if command.sub_cmd_name else None
+                        ),
+                        "sub_cmd_description": (
+                            str(command.sub_cmd_description)
+                            if command.sub_cmd_description
+                            else None
+                        ),
+                        "scopes": [int(x) for x in command.scopes],
+                        "default_member_permissions": (
+                            int(command.default_member_permissions)
+                            if command.default_member_permissions is not None
+                            else None
+                        ),
+                        "dm_permission": command.dm_permission,
+                        "nsfw": command.nsfw,
+                        "integration_types": [int(x) for x in command.integration_types],
+                        "contexts": [int(x) for x in command.contexts],
+                        "options": [
+                            x if isinstance(x, dict) else x.to_dict()
+                            for x in command.options or []
+                        ],
+                    }
+                )
+
+            for listener in ext.listeners:
+                listeners.append(listener.event)
+
+        self.manifest[extension] = {
+            "hash": self._source_hash(extension),
+            "stubbable": stubbable,
+            "commands": commands,
+            "listeners": listeners,
+        }
+        self.manifest.save()
+
+    def _register_stubs(self, extension: str):
+        assert self.bot is not None
+
+        entry = self.manifest[extension]
+        stub_commands = []
+        stub_listeners = []
+
+        for data in entry["commands"]:
+            command = interactions.SlashCommand(
+                **{k: v for k, v in data.items() if v is not None},
+                callback=self._command_stub(extension),
+            )
+
+            for option in data["options"]:
+                if option.get("autocomplete"):
+                    command.autocomplete_callbacks[option["name"]] = (
+                        self._autocomplete_stub(extension, command)
+                    )
+
+            self.bot.add_interaction(command)
+            stub_commands.append(command)
+
+        for event in set(entry["listeners"]):
+            listener = interactions.Listener.create(event)(
+                self._listener_stub(extension, event)
+            )
+            self.bot.add_listener(listener)
+            stub_listeners.append(listener)
+
+        self._stubs[extension] = (stub_commands, stub_listeners)
+        self.metrics[extension] = ExtensionMetrics(lazy=True)
+
+    def _remove_stubs(self, extension: str):
+        assert self.bot is not None
+
+        stub_commands, stub_listeners = self._stubs.pop(extension, ([], []))
+
+        for command in stub_commands:
+            for scope in command.scopes:
+                self.bot.interactions_by_scope.get(scope, {}).pop(
+                    command.resolved_name, None
+                )
+
+        for listener in stub_listeners:
+            self.bot.listeners[listener.event].remove(listener)
+
+    async def _load_lazy(self, extension: str):
+        lock = self._locks.setdefault(extension, asyncio.Lock())
+
+        async with lock:
+            if extension in self._stubs:
+                memory_before = get_process_memory()
+
+                # Importing is the slow part and doesn't need the loop
+                seconds, _ = await asyncio.to_thread(_timed_import, extension)
+                self.metrics[extension].import_seconds = seconds
+
+                self.load(extension, memory_before=memory_before)
+
+    def _find_command(self, extension: str, resolved_name: str):
+        assert self.bot is not None
+
+        for ext in self.bot.get_extensions(extension):
+            for command in ext.commands:
+                if getattr(command, "resolved_name", None) == resolved_name:
+                    return command
+
+        raise LookupError(f"{extension} has no command {resolved_name} anymore")
+
+    def _command_stub(self, extension: str):
+        async def stub(ctx: interactions.SlashContext, **kwargs):
+            await self._load_lazy(extension)
+            if ctx.command is None:
+                raise LookupError(f"Stub of {extension} was called without a command")
+
+            command = self._find_command(extension, ctx.command.resolved_name)
+
+            return await command(ctx, **kwargs)
+
+        return stub
+
+    def _autocomplete_stub(self, extension: str, stub_command: interactions.SlashCommand):
+        async def stub(ctx: interactions.AutocompleteContext):
+            await self._load_lazy(extension)
+            command = self._find_command(extension, stub_command.resolved_name)
+            if not isinstance(command, interactions.SlashCommand):
+                raise LookupError(f"{stub_command.resolved_name} of {extension} is not a slash command anymore")
+
+            callback = command.autocomplete_callbacks[str(ctx.focussed_option.name)]
+
+            return await command.call_with_binding(callback, ctx)
+
+        return stub
+
+    def _listener_stub(self, extension: str, event_name: str):
+        async def stub(event: interactions.events.BaseEvent):
+            await self._load_lazy(extension)
+
+            assert self.bot is not None
+            for ext in self.bot.get_extensions(extension):
+                for listener in ext.listeners:
+                    if listener.event == event_name:
+                        await listener(event)
+
+        return stub
+
+
+class ExtensionCatalog:
+    """
+    Names of the extension files (without the disabled ones starting with _), for autocomplete.
+
+    The names are only read again when the mtime of the directory changed (adding, removing or renaming a file changes it) or after invalidate().
+    search() finds prefixes with a binary search in the sorted names, only if that gives less than limit results it also looks for substrings and then for the letters in order (fuzzy).
+    """
+
+    def __init__(self, directory: str = "extensions") -> None:
+        self.directory = directory
+        self._mtime_ns: Optional[int] = None
+        self._names: List[str] = []
+        self._lower_names: List[str] = []
+
+    def invalidate(self):
+        self._mtime_ns = None
+
+    def names(self) -> List[str]:
+        mtime_ns = os.stat(self.directory).st_mtime_ns
+        if mtime_ns != self._mtime_ns:
+            self._names = sorted(
+                (
+                    x.name[: -len(".py")]
+                    for x in os.scandir(self.directory)
+                    if x.is_file()
+                    and x.name.endswith(".py")
+                    and not x.name.startswith("_")
+                ),
+                key=str.lower,
+            )
+            self._lower_names = [x.lower() for x in self._names]
+            self._mtime_ns = mtime_ns
+
+        return self._names
+
+    def search(self, text: str, limit: int = 25) -> List[str]:
+        names = self.names()
+        text = text.lower()
+
+        if not text:
+            return names[:limit]
+
+        start = bisect.bisect_left(self._lower_names, text)
+        results = []
+        for index in range(start, len(names)):
+            if len(results) >= limit or not self._lower_names[index].startswith(text):
+                break
+            results.append(names[index])
+
+        if len(results) < limit:
+            found = set(results)
+            substring = sorted(
+                (
+                    (lower.find(text), len(lower), name)
+                    for name, lower in zip(names, self._lower_names)
+                    if name not in found and text in lower
+                ),
+            )
+            results += [x[2] for x in substring[: limit - len(results)]]
+
+        if len(results) < limit:
+            found = set(results)
+            fuzzy = sorted(
+                (span, len(lower), name)
+                for name, lower in zip(names, self._lower_names)
+                if name not in found
+                and (span := _fuzzy_span(text, lower)) is not None
+            )
+            results += [x[2] for x in fuzzy[: limit - len(results)]]
+
+        return results
+
+
+def _fuzzy_span(text: str, name: str) -> Optional[int]:
+    """
+    How far apart the letters of text are in name, when they appear in that order. None if they don't.
+    """
+    position = name.find(text[0])
+    if position == -1:
+        return None
+
+    start = position
+    for char in text[1:]:
+        position = name.find(char, position + 1)
+        if position == -1:
+            return None
+
+    return position - start
+
+
+EXTENSION_LOADER = ExtensionLoader()
+EXTENSION_CATALOG = ExtensionCatalog()
@@ -1,25 +1,55 @@
-import traceback
-from typing import Union
+import ctypes
+import os
+import sys
+from typing import Optional, Union
 
 import interactions
 
-from internal_tools.configuration import CONFIG
+from internal_tools.error_reporter import ERROR_REPORTER
 
 
 async def error_webhook_send(
     txt_or_error: Union[str, Exception], client: interactions.Client
 ):
-    if isinstance(txt_or_error, Exception):
-        error_text = "".join(
-            traceback.format_exception(
-                type(txt_or_error), txt_or_error, txt_or_error.__traceback__
-            )
-        )  # type: ignore
-        txt_or_error = f"Unpredicted Error:\n```\n{error_text}\n```"
-
-    if CONFIG["GENERAL"]["ERROR_WEBHOOK_URL"]:
-        webhook = interactions.Webhook.from_url(
-            CONFIG["GENERAL"]["ERROR_WEBHOOK_URL"], client=client
-        )
-
-        await webhook.send(txt_or_error)
+    """
+    Queues the text or exception for the error webhook. Duplicates are counted and sent together in the background, see ErrorReporter.
+    """
+    ERROR_REPORTER.report(txt_or_error, client)
+
+
+def get_process_memory() -> Optional[int]:
+    """
+    Resident memory (RSS) of this process in bytes. None on platforms where it can't be read cheaply.
+    """
+    if sys.platform == "win32":
+
+        class PROCESS_MEMORY_COUNTERS(ctypes.Structure):
+            _fields_ = [
+                ("cb", ctypes.c_ulong),
+                ("PageFaultCount", ctypes.c_ulong),
+                ("PeakWorkingSetSize", ctypes.c_size_t),
+                ("WorkingSetSize", ctypes.c_size_t),
+                ("QuotaPeakPagedPoolUsage", ctypes.c_size_t),
+                ("QuotaPagedPoolUsage", ctypes.c_size_t),
+                ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t),
+                ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+                ("PagefileUsage", ctypes.c_size_t),
+                ("PeakPagefileUsage", ctypes.c_size_t),
+            ]
+
+        counters = PROCESS_MEMORY_COUNTERS()
+        counters.cb = ctypes.sizeof(counters)
+        if ctypes.windll.psapi.GetProcessMemoryInfo(  # type: ignore
+            ctypes.windll.kernel32.GetCurrentProcess(),  # type: ignore
+            ctypes.byref(counters),
+            counters.cb,
+        ):
+            return counters.WorkingSetSize
+
+        return None
+
+    try:
+        with open("/proc/self/statm", "rb") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        return None
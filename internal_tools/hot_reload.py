@@ -0,0 +1,277 @@
+import ast
+import asyncio
+import hashlib
+import importlib
+import logging
+import os
+import sys
+import time
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from internal_tools.extension_loader import EXTENSION_LOADER
+
+try:
+    import watchfiles  # pyright: ignore[reportMissingImports]
+except ImportError:  # Without it, the files are polled
+    watchfiles = None
+
+__all__ = ["HotReloader"]
+__reloadable__ = False
+
+logger = logging.getLogger("DiscordBot")
+
+
+def _module_name(path: str) -> Optional[str]:
+    """
+    extensions/owner.py -> extensions.owner, None for everything that isn't a watched module.
+    """
+    path = os.path.relpath(path).replace(os.sep, "/")
+    if not path.endswith(".py"):
+        return None
+
+    parts = path[: -len(".py")].split("/")
+    if parts[-1] == "__init__":
+        parts.pop()
+
+    if len(parts) != 2 or parts[0] not in HotReloader.watched:
+        return None
+
+    return ".".join(parts)
+
+
+def _module_path(module: str) -> str:
+    path = module.replace(".", "/")
+    if os.path.isdir(path):
+        return f"{path}/__init__.py"
+
+    return f"{path}.py"
+
+
+def _hash_file(path: str) -> Optional[str]:
+    try:
+        with open(path, "rb") as f:
+            return hashlib.sha1(f.read()).hexdigest()
+    except FileNotFoundError:
+        return None
+
+
+def _imported_tools(path: str) -> Set[str]:
+    """
+    The internal_tools modules a file imports, read without importing it.
+    """
+    try:
+        with open(path, "rb") as f:
+            tree = ast.parse(f.read())
+    except (OSError, SyntaxError):
+        return set()
+
+    tools = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            names = [x.name for x in node.names]
+        elif isinstance(node, ast.ImportFrom) and node.module:
+            if node.module == "internal_tools":
+                names = [f"internal_tools.{x.name}" for x in node.names]
+            else:
+                names = [node.module]
+        else:
+            continue
+
+        tools.update(
+            ".".join(x.split(".")[:2]) for x in names if x.startswith("internal_tools.")
+        )
+
+    return tools
+
+
+class HotReloader:
+    """
+    Watches extensions/ and internal_tools/ and reloads only the modules whose content changed, plus everything that imports or depends on them.
+    Uses watchfiles (inotify on Linux) when it is installed, otherwise the files are polled.
+    Modules that hold state everything else shares (the configuration, the loader itself, singletons like SCHEDULER that bot.py started) can't be swapped out while running, a reloaded copy would be a second, empty instance.
+    They set __reloadable__ = False, changing them only prints that a restart is needed.
+    """
+
+    watched = ("extensions", "internal_tools")
+
+    def __init__(self, debounce: float = 0.5, poll_interval: float = 1.0) -> None:
+        self.debounce = debounce
+        self.poll_interval = poll_interval
+        self.hashes: Dict[str, str] = {}
+        self.task: Optional[asyncio.Task] = None
+
+    def _files(self) -> Iterable[str]:
+        for directory in self.watched:
+            for entry in os.scandir(directory):
+                if entry.name.endswith(".py"):
+                    yield entry.path
+                elif entry.is_dir() and os.path.exists(f"{entry.path}/__init__.py"):
+                    yield f"{entry.path}/__init__.py"
+
+    def snapshot(self):
+        """
+        Remembers the current content of all watched files, changes are compared against this.
+        """
+        self.hashes = {}
+        for path in self._files():
+            module = _module_name(path)
+            file_hash = _hash_file(path)
+            if module is not None and file_hash is not None:
+                self.hashes[module] = file_hash
+
+    def start(self):
+        """
+        Starts watching in the background, has to be called from within the running loop.
+        """
+        self.task = asyncio.create_task(self.run())
+
+    async def run(self):
+        self.snapshot()
+
+        if watchfiles is not None:
+            async for changes in watchfiles.awatch(
+                *self.watched, debounce=int(self.debounce * 1000)
+            ):
+                self.apply(path for _, path in changes)
+        else:
+            await self._poll()
+
+    async def _poll(self):
+        stats = self._stats()
+        pending: Set[str] = set()
+        last_change = 0.0
+
+        while True:
+            await asyncio.sleep(self.poll_interval)
+
+            new_stats = self._stats()
+            changed = {
+                path
+                for path in stats.keys() | new_stats.keys()
+                if stats.get(path) != new_stats.get(path)
+            }
+            stats = new_stats
+
+            if changed:
+                pending |= changed
+                last_change = time.monotonic()
+            elif pending and time.monotonic() - last_change >= self.debounce:
+                self.apply(pending)
+                pending = set()
+
+    def _stats(self) -> Dict[str, Tuple[int, int]]:
+        stats = {}
+        for path in self._files():
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            stats[path] = (stat.st_mtime_ns, stat.st_size)
+
+        return stats
+
+    def changed_modules(self, paths: Iterable[str]) -> List[str]:
+        """
+        The modules of the given paths whose content is different from the last time, saves and touches without a change are ignored.
+        """
+        changed = []
+
+        for module in {_module_name(path) for path in paths}:
+            if module is None:
+                continue
+
+            file_hash = _hash_file(_module_path(module))
+            if file_hash == self.hashes.get(module):
+                continue
+
+            if file_hash is None:
+                del self.hashes[module]
+            else:
+                self.hashes[module] = file_hash
+            changed.append(module)
+
+        return sorted(changed)
+
+    @staticmethod
+    def is_reloadable(module: str) -> bool:
+        return getattr(sys.modules.get(module), "__reloadable__", True)
+
+    def tool_importers(self) -> Dict[str, Set[str]]:
+        """
+        For every internal_tools module, which watched modules import it.
+        """
+        importers: Dict[str, Set[str]] = {}
+        for module in self.hashes:
+            for tool in _imported_tools(_module_path(module)):
+                importers.setdefault(tool, set()).add(module)
+
+        return importers
+
+    def apply(self, paths: Iterable[str]):
+        changed = self.changed_modules(paths)
+        if not changed:
+            return
+
+        start = time.perf_counter()
+
+        importers = self.tool_importers()
+        tools = [x for x in changed if x.startswith("internal_tools.")]
+        extensions = {x for x in changed if x.startswith("extensions.")}
+
+        blocked = [x for x in tools if not self.is_reloadable(x)]
+        if blocked:
+            logger.warning(f"Changes in {', '.join(blocked)} need a restart of the Bot")
+
+        # Everything that imports a reloaded tool holds references to the old version
+        to_reload: List[str] = []
+        queue = [x for x in tools if self.is_reloadable(x)]
+        while queue:
+            module = queue.pop(0)
+            if module in to_reload or not self.is_reloadable(module):
+                continue
+
+            if module.startswith("extensions."):
+                extensions.add(module)
+            else:
+                to_reload.append(module)
+                queue += sorted(importers.get(module, ()))
+
+        for module in self._import_order(to_reload, importers):
+            if module in sys.modules and os.path.exists(_module_path(module)):
+                try:
+                    importlib.reload(sys.modules[module])
+                except Exception as e:
+                    logger.exception(f"Could not reload {module}: {e}")
+
+        loaded = EXTENSION_LOADER.reload_changed(
+            sorted(
+                x for x in extensions if not x.split(".")[-1].startswith("_")
+            )
+        )
+
+        duration = (time.perf_counter() - start) * 1000
+        message = f"Hot reload of {', '.join(changed)} took {duration:.1f} ms (reloaded: {', '.join(to_reload + loaded) or 'nothing'})"
+        logger.info(message)
+
+    def _import_order(
+        self, modules: List[str], importers: Dict[str, Set[str]]
+    ) -> List[str]:
+        """
+        Sorts modules so that every one is reloaded after the ones it imports.
+        """
+        ordered: List[str] = []
+
+        def visit(module: str, seen: Set[str]):
+            if module in ordered or module in seen:
+                return
+
+            seen.add(module)
+            for imported in modules:
+                if module in importers.get(imported, ()):
+                    visit(imported, seen)
+            ordered.append(module)
+
+        for module in modules:
+            visit(module, set())
+
+        return ordered
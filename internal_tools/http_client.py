@@ -0,0 +1,237 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+import aiohttp
+import interactions
+import orjson
+from multidict import CIMultiDict, CIMultiDictProxy
+from yarl import URL
+
+from internal_tools.command_metrics import LatencyHistogram
+
+__all__ = ["HTTP_CLIENT", "HttpClient", "HttpResponse"]
+__reloadable__ = False
+
+
+class HttpResponse:
+    """
+    A response that was read completely, so it can be cached and used after the connection went back to the pool.
+    """
+
+    __slots__ = ("status", "headers", "body", "url")
+
+    def __init__(
+        self, status: int, headers: CIMultiDictProxy, body: bytes, url: URL
+    ) -> None:
+        self.status = status
+        self.headers = headers
+        self.body = body
+        self.url = url
+
+    @property
+    def ok(self) -> bool:
+        return self.status < 400
+
+    def json(self) -> Any:
+        return orjson.loads(self.body)
+
+    def text(self, encoding: str = "utf-8") -> str:
+        return self.body.decode(encoding, errors="replace")
+
+
+def _cache_key(url: str, params: Any, headers: Any) -> Tuple[str, str]:
+    full_url = URL(url)
+    if params:
+        full_url = full_url.update_query(params)
+
+    return str(full_url), repr(sorted(CIMultiDict(headers or {}).items()))
+
+
+class _CacheEntry:
+    __slots__ = ("response", "expires", "etag", "last_modified")
+
+    def __init__(self, response: HttpResponse, ttl: float) -> None:
+        self.response = response
+        self.expires = time.monotonic() + ttl
+        self.etag = response.headers.get("ETag")
+        self.last_modified = response.headers.get("Last-Modified")
+
+
+class HostStats:
+    __slots__ = ("requests", "errors", "latency")
+
+    def __init__(self) -> None:
+        self.requests = 0
+        self.errors = 0
+        self.latency = LatencyHistogram()
+
+
+class HttpClient:
+    """
+    One aiohttp session for all Extensions, so connections to the same host are kept alive and reused instead of paying the TCP and TLS setup for every request. DNS lookups are cached for dns_cache_seconds.
+    At most limit connections are open at once, limit_per_host of them to the same host.
+
+    GET requests with cache_ttl are answered from an in-memory LRU cache (at most cache_size responses) for that many seconds. After that, responses with an ETag or Last-Modified header are revalidated, a 304 only refreshes the cached one.
+    The session is opened on the first request and closed when the Bot stops (see install()).
+    """
+
+    def __init__(
+        self,
+        limit: int = 100,
+        limit_per_host: int = 10,
+        dns_cache_seconds: int = 300,
+        keepalive_seconds: float = 30,
+        timeout_seconds: float = 30,
+        cache_size: int = 1000,
+        max_hosts: int = 500,
+    ) -> None:
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.dns_cache_seconds = dns_cache_seconds
+        self.keepalive_seconds = keepalive_seconds
+        self.timeout_seconds = timeout_seconds
+        self.cache_size = cache_size
+        self.max_hosts = max_hosts
+
+        self.hosts: Dict[str, HostStats] = {}
+        self.cache_hits = 0
+        self.cache_revalidated = 0
+        self.cache_misses = 0
+
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._cache: "OrderedDict[Tuple[str, str], _CacheEntry]" = OrderedDict()
+
+    def install(self, bot: interactions.Client):
+        previous_stop = bot.stop
+
+        async def stop():
+            await self.close()
+            await previous_stop()
+
+        bot.stop = stop  # type: ignore
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        """
+        The shared session, for what request() doesn't cover (like streaming). Don't close it.
+        """
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(
+                    limit=self.limit,
+                    limit_per_host=self.limit_per_host,
+                    ttl_dns_cache=self.dns_cache_seconds,
+                    keepalive_timeout=self.keepalive_seconds,
+                ),
+                timeout=aiohttp.ClientTimeout(total=self.timeout_seconds),
+                json_serialize=lambda x: orjson.dumps(x).decode(),
+            )
+
+        return self._session
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+
+    def host_stats(self, host: str) -> HostStats:
+        stats = self.hosts.get(host)
+        if stats is None:
+            if len(self.hosts) >= self.max_hosts:
+                host = "other"
+            stats = self.hosts.setdefault(host, HostStats())
+
+        return stats
+
+    @property
+    def cache_hit_rate(self) -> Optional[float]:
+        """
+        Share of the cacheable requests that didn't need a full response (fresh hits and 304s).
+        """
+        total = self.cache_hits + self.cache_revalidated + self.cache_misses
+        if total == 0:
+            return None
+
+        return (self.cache_hits + self.cache_revalidated) / total
+
+    async def request(
+        self, method: str, url: str, cache_ttl: Optional[float] = None, **kwargs
+    ) -> HttpResponse:
+        """
+        Sends a request and reads the whole response. Takes the same keyword arguments as aiohttp.ClientSession.request.
+        cache_ttl only applies to GET requests.
+        """
+        if cache_ttl is None or method.upper() != "GET":
+            return await self._send(method, url, **kwargs)
+
+        cache_key = _cache_key(url, kwargs.get("params"), kwargs.get("headers"))
+        entry = self._cache.get(cache_key)
+
+        if entry is not None:
+            self._cache.move_to_end(cache_key)
+
+            if entry.expires > time.monotonic():
+                self.cache_hits += 1
+                return entry.response
+
+            if entry.etag or entry.last_modified:
+                headers = CIMultiDict(kwargs.pop("headers", None) or {})
+                if entry.etag:
+                    headers["If-None-Match"] = entry.etag
+                if entry.last_modified:
+                    headers["If-Modified-Since"] = entry.last_modified
+
+                response = await self._send(method, url, headers=headers, **kwargs)
+                if response.status == 304:
+                    self.cache_revalidated += 1
+                    entry.expires = time.monotonic() + cache_ttl
+                    return entry.response
+
+                self.cache_misses += 1
+                self._store(cache_key, response, cache_ttl)
+                return response
+
+        self.cache_misses += 1
+        response = await self._send(method, url, **kwargs)
+        self._store(cache_key, response, cache_ttl)
+        return response
+
+    async def get(self, url: str, cache_ttl: Optional[float] = None, **kwargs) -> HttpResponse:
+        return await self.request("GET", url, cache_ttl=cache_ttl, **kwargs)
+
+    async def post(self, url: str, **kwargs) -> HttpResponse:
+        return await self.request("POST", url, **kwargs)
+
+    def _store(self, cache_key: Tuple[str, str], response: HttpResponse, ttl: float):
+        if response.status != 200 or "no-store" in response.headers.get("Cache-Control", ""):
+            self._cache.pop(cache_key, None)
+            return
+
+        self._cache[cache_key] = _CacheEntry(response, ttl)
+        self._cache.move_to_end(cache_key)
+
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    async def _send(self, method: str, url: str, **kwargs) -> HttpResponse:
+        stats = self.host_stats(URL(url).host or "")
+        stats.requests += 1
+        start = time.perf_counter()
+
+        try:
+            async with self.session.request(method, url, **kwargs) as response:
+                body = await response.read()
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            stats.errors += 1
+            raise
+        finally:
+            stats.latency.add(time.perf_counter() - start)
+
+        if response.status >= 500:
+            stats.errors += 1
+
+        return HttpResponse(response.status, response.headers, body, response.url)
+
+
+HTTP_CLIENT = HttpClient()
@@ -0,0 +1,130 @@
+import atexit
+import copy
+import datetime
+import logging
+import logging.handlers
+import queue
+import sys
+from typing import Optional
+
+import orjson
+
+from internal_tools.configuration import CONFIG
+
+__all__ = ["JsonLinesFormatter", "setup_logging"]
+__reloadable__ = False
+
+# Passed with extra={...}, written as their own fields in JSON lines
+STRUCTURED_FIELDS = ("command", "guild_id", "latency_ms")
+
+
+class JsonLinesFormatter(logging.Formatter):
+    """
+    One JSON object per line, with the STRUCTURED_FIELDS that were given to the log call.
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.datetime.fromtimestamp(record.created).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+
+        for field in STRUCTURED_FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                entry[field] = value
+
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+
+        return orjson.dumps(entry, default=str).decode()
+
+
+class _TextFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        text = super().format(record)
+
+        fields = [
+            f"{field}={getattr(record, field)}"
+            for field in STRUCTURED_FIELDS
+            if getattr(record, field, None) is not None
+        ]
+        if fields:
+            text = f"{text} [{' '.join(fields)}]"
+
+        return text
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Only the arguments are merged in right away (they could change until the record is written), formatting happens in the listener thread
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+def setup_logging(filename: Optional[str] = None) -> logging.handlers.QueueListener:
+    """
+    Sets up logging as configured in LOGGING in the GENERAL.json config.
+
+    Log calls only put the record into a queue, a background thread formats and writes them. So logging never blocks the event loop on disk or console I/O.
+    The log file is rotated by size (ROTATE_MAX_BYTES) or, if ROTATE_WHEN is set (like "midnight"), by time, keeping BACKUP_COUNT old files.
+    FORMAT "json" writes JSON lines instead of text. LEVELS sets levels for single loggers, like {"interactions": "WARNING"}.
+    filename replaces FILE, supervisor.py gives each of its workers an own file.
+    """
+    global _listener
+
+    if _listener is not None:
+        return _listener
+
+    config = CONFIG["GENERAL"]["LOGGING"]
+    filename = filename or config["FILE"]
+
+    if config["ROTATE_WHEN"]:
+        file_handler: logging.Handler = logging.handlers.TimedRotatingFileHandler(
+            filename,
+            when=config["ROTATE_WHEN"],
+            backupCount=config["BACKUP_COUNT"],
+            encoding="utf-8",
+        )
+    else:
+        file_handler = logging.handlers.RotatingFileHandler(
+            filename,
+            maxBytes=config["ROTATE_MAX_BYTES"],
+            backupCount=config["BACKUP_COUNT"],
+            encoding="utf-8",
+        )
+
+    if config["FORMAT"] == "json":
+        file_handler.setFormatter(JsonLinesFormatter())
+    else:
+        file_handler.setFormatter(
+            _TextFormatter("%(asctime)s:%(levelname)s:%(name)s: %(message)s")
+        )
+
+    console_handler = logging.StreamHandler(sys.stdout)
+    console_handler.setLevel(config["CONSOLE_LEVEL"])
+    console_handler.setFormatter(logging.Formatter("%(message)s"))
+
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+
+    root = logging.getLogger()
+    root.setLevel(config["LEVEL"])
+    root.addHandler(_QueueHandler(log_queue))
+
+    for name, level in config["LEVELS"].items():
+        logging.getLogger(name).setLevel(level)
+
+    _listener = logging.handlers.QueueListener(
+        log_queue, file_handler, console_handler, respect_handler_level=True
+    )
+    _listener.start()
+    atexit.register(_listener.stop)
+
+    return _listener
@@ -0,0 +1,160 @@
+import asyncio
+import datetime
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import Counter, deque
+from typing import Deque, List, Optional
+
+import interactions
+
+from internal_tools.command_metrics import LatencyHistogram
+from internal_tools.general import error_webhook_send
+
+__all__ = ["LOOP_MONITOR", "LagIncident", "LoopLagMonitor"]
+__reloadable__ = False
+
+_PROJECT_DIR = os.path.abspath(".")
+_MAX_SAMPLES = 50
+
+
+def _is_project_frame(frame: traceback.FrameSummary) -> bool:
+    filename = os.path.abspath(frame.filename)
+    return filename.startswith(_PROJECT_DIR) and "site-packages" not in filename
+
+
+class LagIncident:
+    """
+    One time the loop was blocked for longer than the threshold.
+    """
+
+    def __init__(self, started: datetime.datetime, stack: traceback.StackSummary) -> None:
+        self.started = started
+        self.lag = 0.0
+        self.stack = stack
+        self.culprits: Counter = Counter()
+
+    @property
+    def culprit(self) -> str:
+        """
+        The function that was seen most often while the loop was blocked, from this project if possible.
+        """
+        if not self.culprits:
+            return "unknown"
+
+        return self.culprits.most_common(1)[0][0]
+
+    def add_sample(self, stack: traceback.StackSummary):
+        frames = [x for x in stack if _is_project_frame(x)] or list(stack)
+        if frames:
+            frame = frames[-1]
+            self.culprits[f"{frame.name} ({os.path.relpath(frame.filename)}:{frame.lineno})"] += 1
+
+    def format_stack(self, limit: int = 8) -> str:
+        return "".join(self.stack.format()[-limit:])
+
+
+class LoopLagMonitor:
+    """
+    Measures how late the event loop wakes up a task that sleeps for interval seconds. That delay is how long something blocked the loop, every event and command waited that long as well.
+
+    A watchdog thread checks on the loop while it is blocked. Once the block is longer than threshold seconds, it samples the stack of the loop thread (up to 50 times), to find out what is blocking.
+    The last max_incidents are kept in incidents, blocks of report_threshold seconds or more are also sent with error_webhook_send.
+    """
+
+    def __init__(
+        self,
+        interval: float = 0.5,
+        threshold: float = 0.25,
+        report_threshold: float = 5.0,
+        max_incidents: int = 20,
+    ) -> None:
+        self.interval = interval
+        self.threshold = threshold
+        self.report_threshold = report_threshold
+
+        self.lag = 0.0
+        self.max_lag = 0.0
+        self.histogram = LatencyHistogram()
+        self.incidents: Deque[LagIncident] = deque(maxlen=max_incidents)
+
+        self.task: Optional[asyncio.Task] = None
+        self.bot: Optional[interactions.Client] = None
+
+        self._loop_thread_id: Optional[int] = None
+        self._sleep_started = time.monotonic()
+        self._incident: Optional[LagIncident] = None
+        self._samples = 0
+
+    def start(self, bot: Optional[interactions.Client] = None):
+        """
+        Has to be called from within the running loop.
+        """
+        self.bot = bot
+
+        if self.task is None or self.task.done():
+            self._loop_thread_id = threading.get_ident()
+            self.task = asyncio.create_task(self.run())
+            threading.Thread(
+                target=self._watchdog, name="loop-watchdog", daemon=True
+            ).start()
+
+    async def run(self):
+        while True:
+            self._sleep_started = time.monotonic()
+            start = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            self.record(max(time.perf_counter() - start - self.interval, 0.0))
+
+            incident = self._incident
+            self._incident = None
+            if incident is not None and self.lag >= self.threshold:
+                incident.lag = self.lag
+                self.incidents.append(incident)
+
+                if self.lag >= self.report_threshold and self.bot is not None:
+                    await error_webhook_send(
+                        f"The event loop was blocked for {self.lag:.2f} s, mostly in {incident.culprit}:\n```\n{incident.format_stack()}\n```",
+                        self.bot,
+                    )
+
+    def record(self, lag: float):
+        self.lag = lag
+        self.max_lag = max(self.max_lag, lag)
+        self.histogram.add(lag)
+
+    def _watchdog(self):
+        check_interval = min(self.threshold, self.interval) / 2
+
+        while self.task is not None and not self.task.done():
+            time.sleep(check_interval)
+
+            blocked = time.monotonic() - self._sleep_started - self.interval
+            if blocked < self.threshold or self._samples >= _MAX_SAMPLES:
+                if blocked < self.threshold:
+                    self._samples = 0
+                continue
+
+            stack = self._loop_stack()
+            if stack is None:
+                continue
+
+            if self._incident is None:
+                self._incident = LagIncident(datetime.datetime.now(), stack)
+            self._incident.add_sample(stack)
+            self._samples += 1
+
+    def _loop_stack(self) -> Optional[traceback.StackSummary]:
+        frame = sys._current_frames().get(self._loop_thread_id)  # type: ignore
+        if frame is None:
+            return None
+
+        return traceback.extract_stack(frame)
+
+    def recent_incidents(self) -> List[LagIncident]:
+        return list(reversed(self.incidents))
+
+
+LOOP_MONITOR = LoopLagMonitor()
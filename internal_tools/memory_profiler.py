@@ -0,0 +1,175 @@
+import gc
+import os
+import sys
+import tracemalloc
+from collections import Counter
+from typing import List, Optional, Tuple
+
+from internal_tools.configuration import JsonDictSaver, registered_stores
+
+__all__ = ["MEMORY_PROFILER", "MemoryProfiler", "format_bytes", "object_counts", "store_sizes"]
+__reloadable__ = False
+
+# Allocations of the profiler itself are left out of the results
+_IGNORED = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+    tracemalloc.Filter(False, "<unknown>"),
+)
+
+
+def format_bytes(size: float) -> str:
+    for unit in ("B", "KB", "MB"):
+        if abs(size) < 1024:
+            return f"{size:.1f} {unit}" if unit != "B" else f"{size:.0f} B"
+        size /= 1024
+
+    return f"{size:.1f} GB"
+
+
+def _site(trace: tracemalloc.Traceback) -> str:
+    frame = trace[0]
+    filename = os.path.relpath(frame.filename)
+    if filename.startswith(".."):  # Outside of the project, like the standard library
+        filename = frame.filename
+
+    return f"{filename}:{frame.lineno}"
+
+
+class MemoryProfiler:
+    """
+    Starts and stops tracemalloc while the Bot is running. Tracing makes every allocation slower and needs memory for the traces itself, so it should only run while looking for a leak.
+    Every snapshot replaces the previous one, diff() compares against that.
+    """
+
+    def __init__(self) -> None:
+        self.last_snapshot: Optional[tracemalloc.Snapshot] = None
+        self._started_here = False
+
+    @property
+    def is_running(self) -> bool:
+        return tracemalloc.is_tracing()
+
+    def start(self, frames: int = 1):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(frames)
+            self._started_here = True
+
+        self.last_snapshot = self._snapshot()
+
+    def stop(self):
+        if self._started_here:
+            tracemalloc.stop()
+            self._started_here = False
+
+        self.last_snapshot = None
+
+    def traced_memory(self) -> Tuple[int, int]:
+        """
+        Size of all traced allocations right now and at most since start().
+        """
+        return tracemalloc.get_traced_memory()
+
+    def _snapshot(self) -> tracemalloc.Snapshot:
+        return tracemalloc.take_snapshot().filter_traces(_IGNORED)
+
+    def top(self, limit: int = 25) -> List[Tuple[str, str]]:
+        """
+        Allocation sites that hold the most memory right now.
+        """
+        self.last_snapshot = self._snapshot()
+
+        return [
+            (_site(stat.traceback), f"{format_bytes(stat.size)} in {stat.count} blocks")
+            for stat in self.last_snapshot.statistics("lineno")[:limit]
+        ]
+
+    def diff(self, limit: int = 25) -> List[Tuple[str, str]]:
+        """
+        Allocation sites whose memory changed the most since the last snapshot.
+        """
+        snapshot = self._snapshot()
+        previous, self.last_snapshot = self.last_snapshot, snapshot
+        if previous is None:
+            return []
+
+        return [
+            (
+                _site(stat.traceback),
+                f"{'+' if stat.size_diff >= 0 else ''}{format_bytes(stat.size_diff)} (now {format_bytes(stat.size)}, {stat.count_diff:+} blocks)",
+            )
+            for stat in snapshot.compare_to(previous, "lineno")[:limit]
+            if stat.size_diff
+        ]
+
+
+MEMORY_PROFILER = MemoryProfiler()
+
+
+def object_counts(limit: int = 25) -> List[Tuple[str, int]]:
+    """
+    Amount of objects tracked by the garbage collector per type, the most common first. Objects like str and int are not tracked, so they are missing here.
+    """
+    counts = Counter(type(x).__qualname__ for x in gc.get_objects())
+    return counts.most_common(limit)
+
+
+def _data_size(data: object) -> int:
+    """
+    Size of the loaded data of a store, counting objects that are shared (like cached strings) once.
+    """
+    seen = set()
+    size = 0
+    stack = [data]
+
+    while stack:
+        obj = stack.pop()
+        if id(obj) in seen:
+            continue
+        seen.add(id(obj))
+
+        size += sys.getsizeof(obj)
+        if isinstance(obj, dict):
+            stack.extend(obj.keys())
+            stack.extend(obj.values())
+        elif isinstance(obj, list):
+            stack.extend(obj)
+
+    return size
+
+
+def _disk_size(store: JsonDictSaver) -> int:
+    base = f"{store._data_type}/{store._name}"
+    size = 0
+
+    for filename in (
+        store.filename,
+        store.journal_filename,
+        f"{base}.sqlite3",
+        f"{base}.sqlite3-wal",
+    ):
+        if os.path.exists(filename):
+            size += os.path.getsize(filename)
+
+    return size
+
+
+def store_sizes() -> List[Tuple[str, int, Optional[int]]]:
+    """
+    Filename, size on disk and size in memory (None if it isn't loaded) of every JsonDictSaver, biggest in memory first.
+    For sqlite stores, only the values in its cache count.
+    """
+    sizes = []
+
+    for store in registered_stores():
+        memory = None
+        if store.is_loaded:
+            if store.storage == "sqlite":
+                memory = _data_size(store.data._cache)  # type: ignore
+            else:
+                memory = _data_size(store.data)
+
+        sizes.append((store.filename, _disk_size(store), memory))
+
+    return sorted(sizes, key=lambda x: x[2] or 0, reverse=True)
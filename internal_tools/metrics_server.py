@@ -0,0 +1,196 @@
+import bisect
+import math
+from typing import List, Optional
+
+import interactions
+from aiohttp import web
+
+from internal_tools.auto_defer import AUTO_DEFER_TRACKER
+from internal_tools.bot_stats import BOT_STATS
+from internal_tools.command_metrics import COMMAND_METRICS, LatencyHistogram
+from internal_tools.configuration import CONFIG, registered_stores
+from internal_tools.general import get_process_memory
+from internal_tools.http_client import HTTP_CLIENT
+from internal_tools.loop_monitor import LOOP_MONITOR
+from internal_tools.work_pool import WORK_POOL
+
+__all__ = ["MetricsServer"]
+
+# Prometheus "le" bounds, each moved up to the next bucket bound of LatencyHistogram so the counts are exact
+_EXPORTED_BUCKETS = sorted(
+    {
+        bisect.bisect_left(LatencyHistogram.bounds, x)
+        for x in (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+    }
+)
+
+
+def _label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _histogram(lines: List[str], name: str, labels: str, histogram: LatencyHistogram):
+    prefix = f"{labels}," if labels else ""
+    total = 0
+    start = 0
+    for index in _EXPORTED_BUCKETS:
+        total += sum(histogram.counts[start : index + 1])
+        start = index + 1
+        lines.append(
+            f'{name}_bucket{{{prefix}le="{LatencyHistogram.bounds[index]:.4g}"}} {total}'
+        )
+
+    lines.append(f'{name}_bucket{{{prefix}le="+Inf"}} {histogram.count}')
+
+    labels = f"{{{labels}}}" if labels else ""
+    lines.append(f"{name}_sum{labels} {histogram.total}")
+    lines.append(f"{name}_count{labels} {histogram.count}")
+
+
+class MetricsServer:
+    """
+    Small HTTP server for monitoring, configured in METRICS_SERVER in the GENERAL.json config.
+
+    /metrics gives everything the bot already counts anyway in the Prometheus text format, nothing is measured when scraping, so it can be scraped every few seconds.
+    /healthz answers 200 while the gateway connection is up, 503 otherwise.
+    port replaces PORT, supervisor.py gives each of its workers an own one.
+    """
+
+    def __init__(self, bot: interactions.Client, port: Optional[int] = None) -> None:
+        self.bot = bot
+        self.port = port
+        self.runner: Optional[web.AppRunner] = None
+
+    async def start(self):
+        config = CONFIG["GENERAL"]["METRICS_SERVER"]
+
+        app = web.Application()
+        app.router.add_get("/metrics", self.metrics)
+        app.router.add_get("/healthz", self.healthz)
+
+        self.runner = web.AppRunner(app, access_log=None)
+        await self.runner.setup()
+        await web.TCPSite(self.runner, config["HOST"], self.port or config["PORT"]).start()
+
+    async def stop(self):
+        if self.runner is not None:
+            await self.runner.cleanup()
+
+    def gateway_latency(self) -> Optional[float]:
+        latency = self.bot.latency
+        if latency is None or math.isinf(latency):
+            return None
+
+        return latency
+
+    async def healthz(self, request: web.Request) -> web.Response:
+        if self.bot.is_ready and self.gateway_latency() is not None:
+            return web.Response(text="ok")
+
+        return web.Response(status=503, text="not connected")
+
+    async def metrics(self, request: web.Request) -> web.Response:
+        return web.Response(
+            text=self.render(), content_type="text/plain", charset="utf-8"
+        )
+
+    def render(self) -> str:
+        lines = []
+
+        latency = self.gateway_latency()
+        lines.append("# TYPE discord_gateway_latency_seconds gauge")
+        if latency is not None:
+            lines.append(f"discord_gateway_latency_seconds {latency}")
+
+        lines.append("# TYPE discord_guilds gauge")
+        lines.append(f"discord_guilds {BOT_STATS.guilds}")
+        lines.append("# TYPE discord_members gauge")
+        lines.append(f"discord_members {BOT_STATS.members}")
+        lines.append("# TYPE discord_guild_joins_last_hour gauge")
+        lines.append(f"discord_guild_joins_last_hour {BOT_STATS.joins_last_hour}")
+        lines.append("# TYPE discord_guild_leaves_last_hour gauge")
+        lines.append(f"discord_guild_leaves_last_hour {BOT_STATS.leaves_last_hour}")
+
+        lines.append("# TYPE bot_commands_total counter")
+        lines.append("# TYPE bot_command_errors_total counter")
+        lines.append("# TYPE bot_command_late_total counter")
+        for name, stats in COMMAND_METRICS.stats.items():
+            labels = f'command="{_label(name)}"'
+            lines.append(f"bot_commands_total{{{labels}}} {stats.calls}")
+            lines.append(f"bot_command_errors_total{{{labels}}} {stats.errors}")
+            lines.append(f"bot_command_late_total{{{labels}}} {stats.late}")
+
+        lines.append("# TYPE bot_command_first_response_seconds histogram")
+        for name, stats in COMMAND_METRICS.stats.items():
+            _histogram(
+                lines,
+                "bot_command_first_response_seconds",
+                f'command="{_label(name)}"',
+                stats.first_response,
+            )
+
+        lines.append("# TYPE bot_command_duration_seconds histogram")
+        for name, stats in COMMAND_METRICS.stats.items():
+            _histogram(
+                lines,
+                "bot_command_duration_seconds",
+                f'command="{_label(name)}"',
+                stats.total,
+            )
+
+        lines.append("# TYPE bot_auto_deferred_total counter")
+        lines.append(f"bot_auto_deferred_total {AUTO_DEFER_TRACKER.deferred}")
+
+        lines.append("# TYPE bot_work_pool_running gauge")
+        lines.append("# TYPE bot_work_pool_calls_total counter")
+        lines.append("# TYPE bot_work_pool_busy_seconds_total counter")
+        for kind, stats in WORK_POOL.stats.items():
+            lines.append(f'bot_work_pool_running{{kind="{kind}"}} {stats.running}')
+            lines.append(f'bot_work_pool_calls_total{{kind="{kind}"}} {stats.calls}')
+            lines.append(f'bot_work_pool_busy_seconds_total{{kind="{kind}"}} {stats.busy_seconds}')
+        lines.append("# TYPE bot_work_pool_pending gauge")
+        lines.append(f"bot_work_pool_pending {WORK_POOL.pending}")
+        lines.append("# TYPE bot_work_pool_rejected_total counter")
+        lines.append(f"bot_work_pool_rejected_total {WORK_POOL.rejected}")
+
+        lines.append("# TYPE bot_http_requests_total counter")
+        lines.append("# TYPE bot_http_errors_total counter")
+        for host, stats in HTTP_CLIENT.hosts.items():
+            labels = f'host="{_label(host)}"'
+            lines.append(f"bot_http_requests_total{{{labels}}} {stats.requests}")
+            lines.append(f"bot_http_errors_total{{{labels}}} {stats.errors}")
+        lines.append("# TYPE bot_http_request_seconds histogram")
+        for host, stats in HTTP_CLIENT.hosts.items():
+            _histogram(lines, "bot_http_request_seconds", f'host="{_label(host)}"', stats.latency)
+        lines.append("# TYPE bot_http_cache_total counter")
+        lines.append(f'bot_http_cache_total{{result="hit"}} {HTTP_CLIENT.cache_hits}')
+        lines.append(f'bot_http_cache_total{{result="revalidated"}} {HTTP_CLIENT.cache_revalidated}')
+        lines.append(f'bot_http_cache_total{{result="miss"}} {HTTP_CLIENT.cache_misses}')
+
+        lines.append("# TYPE bot_errors_total counter")
+        for error_type, amount in COMMAND_METRICS.errors_by_type.items():
+            lines.append(f'bot_errors_total{{type="{_label(error_type)}"}} {amount}')
+
+        lines.append("# TYPE bot_event_loop_lag_seconds gauge")
+        lines.append(f"bot_event_loop_lag_seconds {LOOP_MONITOR.lag}")
+        lines.append("# TYPE bot_event_loop_lag_max_seconds gauge")
+        lines.append(f"bot_event_loop_lag_max_seconds {LOOP_MONITOR.max_lag}")
+        lines.append("# TYPE bot_event_loop_lag_histogram_seconds histogram")
+        _histogram(lines, "bot_event_loop_lag_histogram_seconds", "", LOOP_MONITOR.histogram)
+
+        lines.append("# TYPE bot_store_writes_total counter")
+        lines.append("# TYPE bot_store_skipped_saves_total counter")
+        lines.append("# TYPE bot_store_write_seconds_total counter")
+        for store in registered_stores():
+            labels = f'store="{_label(store.filename)}"'
+            lines.append(f"bot_store_writes_total{{{labels}}} {store.save_count}")
+            lines.append(f"bot_store_skipped_saves_total{{{labels}}} {store.skipped_saves}")
+            lines.append(f"bot_store_write_seconds_total{{{labels}}} {store.write_seconds}")
+
+        memory = get_process_memory()
+        if memory is not None:
+            lines.append("# TYPE process_resident_memory_bytes gauge")
+            lines.append(f"process_resident_memory_bytes {memory}")
+
+        lines.append("")
+        return "\n".join(lines)
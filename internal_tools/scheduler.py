@@ -0,0 +1,244 @@
+import asyncio
+import datetime
+import heapq
+import logging
+import threading
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from internal_tools.configuration import JsonDictSaver
+
+__all__ = ["SCHEDULER", "ScheduledJob", "Scheduler"]
+__reloadable__ = False
+
+logger = logging.getLogger("DiscordBot")
+
+
+def _job_time(job_id: str) -> int:
+    return int(job_id.split("-")[1])
+
+
+class ScheduledJob:
+    __slots__ = ("id", "handler", "data")
+
+    def __init__(self, id: str, handler: str, data: Any) -> None:
+        self.id = id
+        self.handler = handler
+        self.data = data
+
+    @property
+    def run_at(self) -> datetime.datetime:
+        return datetime.datetime.fromtimestamp(
+            _job_time(self.id) / 1000, tz=datetime.timezone.utc
+        )
+
+
+class Scheduler:
+    """
+    Runs jobs at a given time, like reminders or removing a temporary role. Jobs are kept in a sqlite JsonDictSaver, so they survive restarts, jobs that were due while the Bot was offline run right after start().
+
+    Handlers are registered by name with add_handler() (usually in the __init__ of an Extension), as functions can't be saved. They get the ScheduledJob and are awaited, a job is removed once its handler finished (or failed), so a crash mid-run runs it again after the restart.
+    The due time is part of the job ID, so the heap of due times is built from the keys alone by load(), in a thread and without loading a single job.
+    Due jobs are taken from the heap in batches of batch_size (their values are loaded with one query) and handed to concurrency workers, each taking the next job as soon as its last one is done. A slow handler only keeps its own worker busy.
+    """
+
+    def __init__(
+        self,
+        store_name: str = "scheduled_jobs",
+        batch_size: int = 500,
+        concurrency: int = 20,
+    ) -> None:
+        self.store_name = store_name
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+
+        self.handlers: Dict[str, Callable[[ScheduledJob], Awaitable[Any]]] = {}
+        self.waiting_for_handler: Dict[str, List[str]] = {}
+        self.dispatched = 0
+        self.failed = 0
+        self.max_delay = 0.0
+
+        self.task: Optional[asyncio.Task] = None
+        self.workers: List[asyncio.Task] = []
+
+        self._store: Optional[JsonDictSaver] = None
+        self._store_lock = threading.Lock()  # load() creates the store in a thread
+        self._heap: List[Tuple[int, str]] = []
+        self._tracking = False  # Whether schedule() puts new jobs on the heap, from the start of load() on
+        self._running: Set[str] = set()
+        self._queue: Optional["asyncio.Queue[str]"] = None
+        self._wakeup: Optional[asyncio.Event] = None
+
+    @property
+    def store(self) -> JsonDictSaver:
+        with self._store_lock:
+            if self._store is None:
+                self._store = JsonDictSaver(
+                    self.store_name,
+                    storage="sqlite",
+                    write_behind=True,
+                    flush_interval=1.0,
+                )
+
+        return self._store
+
+    @property
+    def pending(self) -> int:
+        return len(self.store)
+
+    def add_handler(self, name: str, handler: Callable[[ScheduledJob], Awaitable[Any]]):
+        self.handlers[name] = handler
+
+        for job_id in self.waiting_for_handler.pop(name, []):
+            heapq.heappush(self._heap, (_job_time(job_id), job_id))
+        self._wake()
+
+    def remove_handler(self, name: str):
+        self.handlers.pop(name, None)
+
+    def schedule(self, run_at: datetime.datetime, handler: str, data: Any = None) -> str:
+        """
+        Saves a job for run_at (naive datetimes are local time) and gives back its ID.
+        data has to be something a JsonDictSaver can store.
+        """
+        run_at_ms = int(run_at.timestamp() * 1000)
+        job_id = f"job-{run_at_ms:013d}-{uuid.uuid4().hex}"
+
+        self.store[job_id] = {"handler": handler, "data": data}
+        self.store.save()
+
+        if self._tracking:
+            heapq.heappush(self._heap, (run_at_ms, job_id))
+            if self._heap[0][1] == job_id:
+                self._wake()
+
+        return job_id
+
+    def cancel(self, job_id: str) -> bool:
+        """
+        Removes a job that didn't run yet. Gives back whether it existed.
+        """
+        if job_id not in self.store:
+            return False
+
+        del self.store[job_id]  # Its heap entry is skipped when it comes up
+        self.store.save()
+        return True
+
+    def _build_heap(self) -> List[Tuple[int, str]]:
+        heap = [(_job_time(job_id), job_id) for job_id in self.store]
+        heapq.heapify(heap)
+        return heap
+
+    async def load(self):
+        """
+        Builds the heap of due times from the saved jobs in a thread, as listing a million keys takes seconds. run() does it if it wasn't done before.
+        """
+        self._tracking = True
+        heap = await asyncio.to_thread(self._build_heap)
+
+        for entry in self._heap:  # Scheduled while the heap was built, it can have them twice
+            heapq.heappush(heap, entry)
+        self._heap = heap
+
+    def start(self):
+        """
+        Has to be called from within the running loop.
+        """
+        if self.task is not None and not self.task.done():
+            return
+
+        self._wakeup = asyncio.Event()
+        self._queue = asyncio.Queue(self.batch_size)
+        self.task = asyncio.create_task(self.run())
+        self.workers = [asyncio.create_task(self.worker()) for _ in range(self.concurrency)]
+
+    def stop(self):
+        for task in [self.task, *self.workers]:
+            if task is not None:
+                task.cancel()
+
+        self.task = None
+        self.workers = []
+
+    def _wake(self):
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def due_jobs(self) -> List[str]:
+        now = int(time.time() * 1000)
+        batch = []
+
+        while self._heap and self._heap[0][0] <= now and len(batch) < self.batch_size:
+            _, job_id = heapq.heappop(self._heap)
+            if job_id in self.store:  # Not cancelled
+                batch.append(job_id)
+
+        return batch
+
+    async def run(self):
+        """
+        Hands due jobs to the workers, waiting while all of them are busy and batch_size jobs wait already.
+        """
+        assert self._wakeup is not None and self._queue is not None
+
+        if not self._tracking:
+            await self.load()
+
+        while True:
+            batch = self.due_jobs()
+            if batch:
+                self.store.preload(batch)
+                for job_id in batch:
+                    await self._queue.put(job_id)
+                continue
+
+            self._wakeup.clear()
+            timeout = 60.0  # Also picks up changes of the system clock
+            if self._heap:
+                timeout = min(timeout, max(self._heap[0][0] / 1000 - time.time(), 0))
+
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def worker(self):
+        assert self._queue is not None
+
+        while True:
+            job_id = await self._queue.get()
+            if job_id in self._running or job_id not in self.store:  # Cancelled, or on the heap twice
+                continue
+
+            self._running.add(job_id)
+            try:
+                await self.run_job(job_id)
+            finally:
+                self._running.discard(job_id)
+
+    async def run_job(self, job_id: str):
+        value = self.store[job_id]
+        job = ScheduledJob(job_id, value["handler"], value["data"])
+
+        handler = self.handlers.get(job.handler)
+        if handler is None:  # Its Extension isn't loaded (yet)
+            self.waiting_for_handler.setdefault(job.handler, []).append(job_id)
+            return
+
+        self.max_delay = max(self.max_delay, time.time() - _job_time(job_id) / 1000)
+        try:
+            await handler(job)
+        except Exception:
+            self.failed += 1
+            logger.exception(f"Scheduled job {job_id} ({job.handler}) failed")
+        else:
+            self.dispatched += 1
+
+        if job_id in self.store:  # The handler can cancel its own job
+            del self.store[job_id]
+            self.store.save()
+
+
+SCHEDULER = Scheduler()
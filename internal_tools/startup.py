@@ -0,0 +1,62 @@
+import datetime
+import time
+from contextlib import contextmanager
+from typing import List, Optional, Tuple
+
+__all__ = ["STARTUP_PROFILER"]
+__reloadable__ = False
+
+
+class StartupProfiler:
+    """
+    Records how long each phase of the startup took. Recording is cheap, the report is only written when asked for (--profile-startup).
+    """
+
+    def __init__(self) -> None:
+        self.started = time.perf_counter()
+        self.phases: List[Tuple[str, float]] = []
+        self.extension_imports: Optional[Tuple[float, bool]] = None
+
+    @contextmanager
+    def phase(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def record(self, name: str, seconds: float):
+        self.phases.append((name, seconds))
+
+    def record_extension_imports(self, wall_seconds: float, parallel: bool):
+        """
+        Keeps the wall time of all extension imports together. (Single imports overlap in parallel mode, so their sum says nothing)
+        """
+        self.extension_imports = (wall_seconds, parallel)
+
+    def report(self) -> str:
+        lines = [f"Startup profile from {datetime.datetime.now().isoformat()}", ""]
+
+        for name, seconds in self.phases:
+            lines.append(f"{seconds * 1000:>10.1f} ms  {name}")
+
+        if self.extension_imports:
+            wall_seconds, parallel = self.extension_imports
+            lines += [
+                "",
+                f"All extension imports took {wall_seconds * 1000:.1f} ms ({'parallel' if parallel else 'one after another'}, compare with PARALLEL_EXTENSION_IMPORTS switched to see the time saved)",
+            ]
+
+        lines += [
+            "",
+            f"Total: {(time.perf_counter() - self.started) * 1000:.1f} ms",
+        ]
+
+        return "\n".join(lines)
+
+    def write_report(self, filename: str = "startup_profile.txt"):
+        with open(filename, "w", encoding="utf-8") as f:
+            f.write(self.report())
+
+
+STARTUP_PROFILER = StartupProfiler()
@@ -0,0 +1,247 @@
+import bisect
+import datetime
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Hashable,
+    Iterable,
+    List,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+    Union,
+)
+
+__all__ = ["StoreIndex"]
+
+_MISSING = object()
+
+
+def _path_getter(
+    path: Union[str, Sequence[Any]], convert: Callable[[str], Any]
+) -> Callable[[Any], Any]:
+    """
+    Getter for a key path like "settings.language" (or ("settings", "language") for keys that aren't strings).
+    Parts of a dotted path are also tried the way the store converts keys, so "members.123" finds the int key 123.
+    """
+    parts = path.split(".") if isinstance(path, str) else list(path)
+    dotted = isinstance(path, str)
+
+    def getter(value: Any) -> Any:
+        for part in parts:
+            if not isinstance(value, dict):
+                return None
+
+            if part in value:
+                value = value[part]
+            elif dotted and convert(part) in value:
+                value = value[convert(part)]
+            else:
+                return None
+
+        return value
+
+    return getter
+
+
+def _kind(value: Any) -> str:
+    """
+    Values are only sorted against values of the same kind, as int and str or naive and aware datetimes can't be compared with each other.
+    """
+    if isinstance(value, (int, float)):  # bool too
+        return "number"
+    if isinstance(value, str):
+        return "str"
+    if isinstance(value, (datetime.datetime, datetime.time)):
+        return type(value).__name__ if value.utcoffset() is None else f"{type(value).__name__} with timezone"
+
+    return type(value).__name__
+
+
+class StoreIndex:
+    """
+    Secondary index over the values of a JsonDictSaver, made with JsonDictSaver.add_index().
+
+    Keeps the keys per indexed value plus the values in sorted order, so equality lookups take constant time and range and prefix lookups take O(log n) plus the amount of results.
+    Values that are None (or where the path doesn't exist) are not indexed. If the value is a list, the key is indexed under every item of it.
+    Values of different kinds (numbers, str, naive datetimes, aware datetimes, ...) can be mixed, like the "123" that is loaded as int next to other strings. They are sorted per kind, range() only gives back values of the kind of its bounds.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        path_or_function: Union[str, Sequence[Any], Callable[[Any], Any]],
+        convert_key: Callable[[str], Any] = lambda x: x,
+    ) -> None:
+        self.name = name
+
+        if callable(path_or_function):
+            self.extractor = path_or_function
+        else:
+            self.extractor = _path_getter(path_or_function, convert_key)
+
+        self._keys_by_value: Dict[Hashable, Set[Any]] = {}
+        self._sorted_values: Dict[str, List[Any]] = {}  # Per _kind()
+        self._values_by_key: Dict[Any, Tuple[Hashable, ...]] = {}
+
+    def __len__(self) -> int:
+        return len(self._values_by_key)
+
+    def _extract(self, value: Any) -> Tuple[Hashable, ...]:
+        if value is _MISSING:
+            return ()
+
+        extracted = self.extractor(value)
+        if extracted is None:
+            return ()
+        if isinstance(extracted, list):
+            return tuple(dict.fromkeys(x for x in extracted if x is not None))
+
+        return (extracted,)
+
+    def _add(self, key: Any, value: Hashable):
+        keys = self._keys_by_value.get(value)
+        if keys is None:
+            # Raises for values that can't be compared, before anything changed
+            bisect.insort(self._sorted_values.setdefault(_kind(value), []), value)
+            keys = self._keys_by_value[value] = set()
+
+        keys.add(key)
+
+    def _remove(self, key: Any, value: Hashable):
+        keys = self._keys_by_value[value]
+        keys.discard(key)
+
+        if not keys:
+            del self._keys_by_value[value]
+
+            kind = _kind(value)
+            values = self._sorted_values[kind]
+            try:
+                del values[bisect.bisect_left(values, value)]
+            except TypeError:  # A single value of a kind that can't be compared at all
+                values.remove(value)
+            if not values:
+                del self._sorted_values[kind]
+
+    def update(self, key: Any, value: Any = _MISSING):
+        """
+        Puts the key under the indexed values of value, or removes it from the index if value is left out.
+        If a value can't be indexed (it can't be compared with others of its kind), the index is left as it was and the TypeError is raised.
+        """
+        new = self._extract(value)
+        old = self._values_by_key.get(key, ())
+        if new == old:
+            return
+
+        added = []
+        try:
+            for indexed in new:
+                if indexed not in old:
+                    self._add(key, indexed)
+                    added.append(indexed)
+        except TypeError:
+            for indexed in added:
+                self._remove(key, indexed)
+            raise
+
+        for indexed in old:
+            if indexed not in new:
+                self._remove(key, indexed)
+
+        if new:
+            self._values_by_key[key] = new
+        else:
+            self._values_by_key.pop(key, None)
+
+    def rebuild(self, items: Iterable[Tuple[Any, Any]]):
+        self._keys_by_value = {}
+        self._values_by_key = {}
+
+        for key, value in items:
+            indexed_values = self._extract(value)
+            if not indexed_values:
+                continue
+
+            self._values_by_key[key] = indexed_values
+            for indexed in indexed_values:
+                self._keys_by_value.setdefault(indexed, set()).add(key)
+
+        self._sorted_values = {}
+        for indexed in self._keys_by_value:
+            self._sorted_values.setdefault(_kind(indexed), []).append(indexed)
+        for values in self._sorted_values.values():
+            values.sort()
+
+    def equal(self, value: Any) -> List[Any]:
+        """
+        Keys whose indexed value is value.
+        """
+        return list(self._keys_by_value.get(value, ()))
+
+    def range(
+        self,
+        start: Any = None,
+        end: Any = None,
+        include_end: bool = False,
+        limit: Optional[int] = None,
+    ) -> List[Any]:
+        """
+        Keys whose indexed value is >= start and < end (<= end with include_end), ordered by that value. None means no bound.
+        Only values of the same kind as the bounds are included (range(start=5) doesn't include strings), without any bound all values are, one kind after the other.
+        """
+        if start is None and end is None:
+            return self._collect(
+                [x for kind in sorted(self._sorted_values) for x in self._sorted_values[kind]],
+                limit,
+            )
+
+        kind = _kind(start if start is not None else end)
+        if start is not None and end is not None and _kind(end) != kind:
+            raise TypeError(f"start and end have to be of the same kind ({kind} and {_kind(end)})")
+
+        values = self._sorted_values.get(kind, [])
+
+        if start is None:
+            low = 0
+        else:
+            low = bisect.bisect_left(values, start)
+
+        if end is None:
+            high = len(values)
+        elif include_end:
+            high = bisect.bisect_right(values, end)
+        else:
+            high = bisect.bisect_left(values, end)
+
+        return self._collect(values[low:high], limit)
+
+    def prefix(self, prefix: str, limit: Optional[int] = None) -> List[Any]:
+        """
+        Keys whose indexed value is a string that starts with prefix, ordered by that value.
+        """
+        strings = self._sorted_values.get("str", [])
+        index = bisect.bisect_left(strings, prefix)
+        values = []
+
+        while index < len(strings):
+            value = strings[index]
+            if not value.startswith(prefix):
+                break
+
+            values.append(value)
+            index += 1
+
+        return self._collect(values, limit)
+
+    def _collect(self, values: List[Any], limit: Optional[int]) -> List[Any]:
+        keys = {}  # dict instead of set to keep the order, keys of list values can be in multiple values
+
+        for value in values:
+            keys.update(dict.fromkeys(self._keys_by_value[value]))
+            if limit is not None and len(keys) >= limit:
+                return list(keys)[:limit]
+
+        return list(keys)
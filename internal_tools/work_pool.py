@@ -0,0 +1,190 @@
+import asyncio
+import concurrent.futures
+import contextvars
+import functools
+import importlib
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple, TypeVar
+
+import interactions
+
+__all__ = ["WORK_POOL", "PoolFull", "WorkPool", "offload", "track_command"]
+__reloadable__ = False
+
+T = TypeVar("T")
+
+# Set for every Command by track_command(), the task running the Command keeps it
+_current_command: "contextvars.ContextVar[Optional[str]]" = contextvars.ContextVar(
+    "current_command", default=None
+)
+
+
+class PoolFull(Exception):
+    """
+    Raised instead of queueing a call when max_queue calls are waiting or running already.
+    """
+
+
+def _timed(call: Callable[[], Any]) -> Tuple[Any, float]:
+    start = time.perf_counter()
+    result = call()
+    return result, time.perf_counter() - start
+
+
+def _call_offloaded(module: str, qualname: str, args: tuple, kwargs: dict) -> Any:
+    """
+    Runs a function decorated with offload() in a pool process. Its name refers to the async wrapper, the original function is found with __wrapped__.
+    """
+    target: Any = importlib.import_module(module)
+    for part in qualname.split("."):
+        target = getattr(target, part)
+
+    return target.__wrapped__(*args, **kwargs)
+
+
+class _ExecutorStats:
+    __slots__ = ("workers", "running", "calls", "busy_seconds")
+
+    def __init__(self) -> None:
+        self.workers = 0
+        self.running = 0
+        self.calls = 0
+        self.busy_seconds = 0.0
+
+
+class WorkPool:
+    """
+    Runs blocking functions outside of the event loop, so they don't hold up every other Command and event.
+    Threads are for I/O and code that releases the GIL (like a big save), processes for CPU heavy Python code. For processes, the function and its arguments have to be picklable.
+
+    At most max_queue calls wait or run at once, more raise PoolFull, so a Command can tell the user to try again instead of piling up work.
+    limit caps how many calls of one name (the Command and the function, see offload()) run at once, the others wait for their turn.
+    The executors are only started on first use, threads and processes can be changed until then.
+    """
+
+    def __init__(self, threads: int = 4, processes: int = 0, max_queue: int = 100) -> None:
+        self.threads = threads
+        self.processes = processes
+        self.max_queue = max_queue
+
+        self.pending = 0
+        self.rejected = 0
+        self.started = time.monotonic()
+        self.stats = {"thread": _ExecutorStats(), "process": _ExecutorStats()}
+        self.running_by_name: Dict[str, int] = {}
+
+        self._executors: Dict[str, concurrent.futures.Executor] = {}
+        self._limits: Dict[str, asyncio.Semaphore] = {}
+
+    def executor(self, kind: str) -> concurrent.futures.Executor:
+        if kind not in self._executors:
+            if kind == "process":
+                workers = self.processes or os.cpu_count() or 1
+                self._executors[kind] = concurrent.futures.ProcessPoolExecutor(workers)
+            else:
+                workers = self.threads
+                self._executors[kind] = concurrent.futures.ThreadPoolExecutor(
+                    workers, thread_name_prefix="work-pool"
+                )
+
+            self.stats[kind].workers = workers
+
+        return self._executors[kind]
+
+    async def run(
+        self,
+        call: Callable[[], T],
+        name: str,
+        process: bool = False,
+        limit: Optional[int] = None,
+    ) -> T:
+        """
+        Runs call (use functools.partial for arguments) in a thread, or in a process with process=True, and gives back its result.
+        """
+        if self.pending >= self.max_queue:
+            self.rejected += 1
+            raise PoolFull(f"{self.pending} calls are waiting or running already")
+
+        self.pending += 1
+        try:
+            if limit is None:
+                return await self._run(call, name, "process" if process else "thread")
+
+            semaphore = self._limits.get(name)
+            if semaphore is None:
+                semaphore = self._limits[name] = asyncio.Semaphore(limit)
+
+            async with semaphore:
+                return await self._run(call, name, "process" if process else "thread")
+        finally:
+            self.pending -= 1
+
+    async def _run(self, call: Callable[[], T], name: str, kind: str) -> T:
+        executor = self.executor(kind)
+        stats = self.stats[kind]
+
+        stats.running += 1
+        self.running_by_name[name] = self.running_by_name.get(name, 0) + 1
+        try:
+            result, seconds = await asyncio.get_running_loop().run_in_executor(
+                executor, _timed, call
+            )
+        finally:
+            stats.running -= 1
+            self.running_by_name[name] -= 1
+            if not self.running_by_name[name]:
+                del self.running_by_name[name]
+
+        stats.calls += 1
+        stats.busy_seconds += seconds
+        return result
+
+    def utilization(self, kind: str) -> Optional[float]:
+        """
+        Share of the time the workers were busy since the pool was created, None if it wasn't used yet.
+        """
+        stats = self.stats[kind]
+        if not stats.workers:
+            return None
+
+        return stats.busy_seconds / (stats.workers * (time.monotonic() - self.started))
+
+
+WORK_POOL = WorkPool()
+
+
+async def track_command(ctx: interactions.BaseContext, *args, **kwargs):
+    """
+    global_pre_run_callback of the client. Remembers which Command runs, so offload() can count and limit its calls per Command.
+    """
+    if isinstance(ctx, interactions.InteractionContext):
+        _current_command.set(ctx.invoke_target)
+
+
+def offload(process: bool = False, limit: Optional[int] = None):
+    """
+    Makes a blocking function awaitable, calls of it run in WORK_POOL. With process=True it has to be defined at module level, or be a method of a module level class whose instances can be pickled (they are sent to the process with the arguments, so not for methods of Extensions).
+    limit caps how many calls of it run at once per Command (see track_command()), calls from outside of Commands share one limit. See WorkPool.
+    """
+
+    def decorator(func: Callable[..., T]) -> Callable[..., Awaitable[T]]:
+        qualname = func.__qualname__
+
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs) -> T:
+            if process:
+                call = functools.partial(
+                    _call_offloaded, func.__module__, qualname, args, kwargs
+                )
+            else:
+                call = functools.partial(func, *args, **kwargs)
+
+            command = _current_command.get()
+            name = qualname if command is None else f"{command}: {qualname}"
+
+            return await WORK_POOL.run(call, name, process=process, limit=limit)
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,213 @@
+import asyncio
+import logging
+import os
+import signal
+import sys
+import time
+from typing import List, Optional
+
+import aiohttp
+from aiohttp import web
+
+from internal_tools.configuration import CONFIG
+from internal_tools.logging_setup import setup_logging
+
+logger = logging.getLogger("DiscordBot")
+
+# Can point to a local fake of the Discord API for testing, bot.py uses it as well
+API_BASE = os.environ.get("DISCORD_API_BASE") or "https://discord.com/api/v10"
+
+
+async def recommended_shards(token: str) -> int:
+    """
+    The amount of shards Discord recommends for the Bot.
+    """
+    async with aiohttp.ClientSession() as session:
+        async with session.get(
+            f"{API_BASE}/gateway/bot", headers={"Authorization": f"Bot {token}"}
+        ) as response:
+            response.raise_for_status()
+            return (await response.json())["shards"]
+
+
+def shard_ranges(total_shards: int, processes: int) -> List[List[int]]:
+    """
+    Splits the shard IDs into one range per process, the sizes differ by at most one.
+    """
+    return [
+        list(range(i * total_shards // processes, (i + 1) * total_shards // processes))
+        for i in range(processes)
+    ]
+
+
+class Worker:
+    """
+    One bot.py process that runs a range of the shards. It is started again whenever it exits, waiting longer the more often it crashed in a row (up to a minute).
+    """
+
+    def __init__(self, index: int, shard_ids: List[int], total_shards: int, port: int) -> None:
+        self.index = index
+        self.shard_ids = shard_ids
+        self.total_shards = total_shards
+        self.port = port
+
+        self.process: Optional[asyncio.subprocess.Process] = None
+        self.restarts = 0
+        self.healthy = False
+        self.last_healthy = time.monotonic()
+
+    @property
+    def name(self) -> str:
+        return f"worker {self.index} (shards {self.shard_ids[0]}-{self.shard_ids[-1]})"
+
+    async def run(self):
+        backoff = 1.0
+
+        while True:
+            self.process = await asyncio.create_subprocess_exec(
+                sys.executable,
+                "bot.py",
+                f"--shard-ids={','.join(str(x) for x in self.shard_ids)}",
+                f"--total-shards={self.total_shards}",
+                f"--metrics-port={self.port}",
+                f"--log-file=bot.worker-{self.index}.log",
+                env={**os.environ, "BOT_SHARED_DATA": "1"},
+            )
+            started = time.monotonic()
+            self.last_healthy = started
+            logger.info(f"Started {self.name}, PID {self.process.pid}")
+
+            code = await self.process.wait()
+            self.healthy = False
+
+            if time.monotonic() - started > 60:  # It ran for a while, so it doesn't crash right on start
+                backoff = 1.0
+
+            logger.warning(f"{self.name} exited with code {code}, restarting in {backoff:.0f} s")
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, 60)
+            self.restarts += 1
+
+    async def check(self, session: aiohttp.ClientSession, host: str):
+        try:
+            async with session.get(
+                f"http://{host}:{self.port}/healthz",
+                timeout=aiohttp.ClientTimeout(total=5),
+            ) as response:
+                self.healthy = response.status == 200
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            self.healthy = False
+
+        if self.healthy:
+            self.last_healthy = time.monotonic()
+
+    def kill(self):
+        if self.process is not None and self.process.returncode is None:
+            self.process.kill()
+
+    async def stop(self):
+        if self.process is not None and self.process.returncode is None:
+            self.process.terminate()
+            await self.process.wait()
+
+
+class Supervisor:
+    """
+    Runs the Bot in multiple processes, configured in SHARDING in the GENERAL.json config. Each worker process gets an own range of the shards.
+
+    TOTAL_SHARDS 0 asks Discord how many shards to use, PROCESSES 0 starts one process per CPU core (but not more than there are shards).
+    Every HEALTH_CHECK_SECONDS the /healthz of every worker is checked. A worker that wasn't healthy for RESTART_UNHEALTHY_AFTER_SECONDS is killed and started again, like one that crashed.
+    The health of all workers is served on /healthz at HOST and PORT of METRICS_SERVER (200 if all of them are healthy, 503 otherwise), the workers use the ports after it for their own metrics server.
+    """
+
+    def __init__(self, total_shards: int, processes: int) -> None:
+        config = CONFIG["GENERAL"]["SHARDING"]
+        self.host = CONFIG["GENERAL"]["METRICS_SERVER"]["HOST"]
+        self.port = CONFIG["GENERAL"]["METRICS_SERVER"]["PORT"]
+        self.check_interval = config["HEALTH_CHECK_SECONDS"]
+        self.unhealthy_limit = config["RESTART_UNHEALTHY_AFTER_SECONDS"]
+
+        self.workers = [
+            Worker(index, shard_ids, total_shards, self.port + 1 + index)
+            for index, shard_ids in enumerate(shard_ranges(total_shards, processes))
+        ]
+
+    async def run(self):
+        app = web.Application()
+        app.router.add_get("/healthz", self.healthz)
+        runner = web.AppRunner(app, access_log=None)
+        await runner.setup()
+        await web.TCPSite(runner, self.host, self.port).start()
+
+        tasks = [asyncio.create_task(worker.run()) for worker in self.workers]
+
+        try:
+            async with aiohttp.ClientSession() as session:
+                while True:
+                    await asyncio.sleep(self.check_interval)
+                    await asyncio.gather(
+                        *[worker.check(session, self.host) for worker in self.workers]
+                    )
+
+                    for worker in self.workers:
+                        if time.monotonic() - worker.last_healthy > self.unhealthy_limit:
+                            logger.warning(
+                                f"{worker.name} wasn't healthy for {self.unhealthy_limit} s, killing it"
+                            )
+                            worker.kill()
+        finally:
+            for task in tasks:
+                task.cancel()
+
+            await asyncio.gather(*[worker.stop() for worker in self.workers])
+            await runner.cleanup()
+
+    async def healthz(self, request: web.Request) -> web.Response:
+        lines = [
+            f"{worker.name}: {'ok' if worker.healthy else 'down'}, {worker.restarts} restart(s)"
+            for worker in self.workers
+        ]
+        status = 200 if all(worker.healthy for worker in self.workers) else 503
+
+        return web.Response(status=status, text="\n".join(lines))
+
+
+async def main():
+    setup_logging()
+
+    if CONFIG["GENERAL"]["TOKEN"] == "":
+        args = [x for x in sys.argv[1:] if not x.startswith("--")]
+        if args:
+            token = args[0]
+        else:
+            token = input(
+                "Token is not set in config, please enter the token here.\n\nToken: "
+            )
+
+        CONFIG["GENERAL"]["TOKEN"] = token
+        CONFIG.save()
+
+    config = CONFIG["GENERAL"]["SHARDING"]
+
+    total_shards = config["TOTAL_SHARDS"] or await recommended_shards(
+        CONFIG["GENERAL"]["TOKEN"]
+    )
+    processes = min(config["PROCESSES"] or os.cpu_count() or 1, total_shards)
+
+    logger.info(f"Running {total_shards} shard(s) in {processes} process(es)")
+
+    main_task = asyncio.current_task()
+    if os.name != "nt":
+        asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, main_task.cancel)  # type: ignore
+
+    try:
+        await Supervisor(total_shards, processes).run()
+    except asyncio.CancelledError:
+        logger.info("Stopped all workers")
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass